@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    """Фоновые миниатюры дописываются до удаления временного MEDIA_ROOT."""
+    yield
+    from posts import thumbnails
+    thumbnails.drain()
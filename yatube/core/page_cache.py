@@ -0,0 +1,151 @@
+import hashlib
+import json
+import re
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import (http_date, urlsafe_base64_decode,
+                               urlsafe_base64_encode)
+from django.views.decorators.cache import cache_page
+
+VERSION_KEY = 'page-version:{}'
+HOLE = re.compile(r'<!--hole:([\w-]+)-->')
+
+
+def get_versions(scopes):
+    """Текущие версии областей; недостающие заводятся меткой времени.
+
+    Метка времени вместо нуля не даёт вытесненной из кэша версии
+    вернуться к значению, под которым уже лежит устаревшая страница.
+    """
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, None)
+        versions.update(cache.get_many(missing))
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    """Сбрасывает страницы, закэшированные для указанных областей."""
+    now = time.time_ns()
+    cache.set_many(
+        {VERSION_KEY.format(scope): now for scope in scopes}, None
+    )
+
+
+def hole_marker(template_name, params):
+    payload = json.dumps([template_name, params])
+    return f'<!--hole:{urlsafe_base64_encode(force_bytes(payload))}-->'
+
+
+def render_hole(request, template_name, params):
+    return render_to_string(template_name, params, request=request)
+
+
+def fill_holes(request, response):
+    """Дорисовывает в общую страницу фрагменты текущего пользователя."""
+    def render_marker(match):
+        template_name, params = json.loads(
+            force_str(urlsafe_base64_decode(match.group(1)))
+        )
+        return render_hole(request, template_name, params)
+
+    content = response.content.decode(response.charset)
+    response.content = HOLE.sub(render_marker, content)
+    del response['Expires']
+    patch_cache_control(response, private=True, no_cache=True, max_age=0)
+
+
+def page_validators(request, versions):
+    """ETag и Last-Modified страницы по версиям её областей.
+
+    Версия - время последнего изменения области, поэтому старшая из них
+    годится в Last-Modified. ETag учитывает ещё и пользователя: в
+    страницу вписаны его персональные фрагменты.
+    """
+    payload = '.'.join(str(value) for value in [request.user.pk, *versions])
+    etag = f'"{hashlib.md5(force_bytes(payload)).hexdigest()}"'
+    return etag, max(versions) // 10 ** 9
+
+
+def respond_conditionally(request, versions, get_response):
+    """Отвечает 304, если у клиента та же версия, не вызывая view."""
+    etag, last_modified = page_validators(request, versions)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is not None:
+        return response
+    response = get_response()
+    if request.method in ('GET', 'HEAD') and response.status_code == 200:
+        response.setdefault('ETag', etag)
+        response.setdefault('Last-Modified', http_date(last_modified))
+    return response
+
+
+def conditional_page(get_scopes):
+    """Условный GET для страницы без общего кэша.
+
+    ``get_scopes(**kwargs)`` возвращает области, от которых зависит
+    страница.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return respond_conditionally(
+                request,
+                get_versions(get_scopes(**kwargs)),
+                lambda: view(request, *args, **kwargs),
+            )
+        return wrapper
+    return decorator
+
+
+def resolve_scopes(scopes, kwargs):
+    resolved = []
+    for scope in scopes:
+        if callable(scope):
+            resolved.extend(scope(**kwargs))
+        else:
+            resolved.append(scope.format(**kwargs))
+    return resolved
+
+
+def versioned_cache_page(timeout, *scopes):
+    """cache_page, ключ которого зависит от версий областей страницы.
+
+    Области - строки, в которые подставляются аргументы view, например
+    ``'group:{slug}'``, или функции, возвращающие список областей по
+    аргументам view, как у conditional_page. Страница живёт ``timeout``
+    секунд или до первого ``bump`` любой из своих областей.
+
+    В кэш попадает одна копия страницы на всех: персональные фрагменты
+    из тега ``{% hole %}`` кэшируются метками и заполняются для каждого
+    запроса, поэтому view не должна сама обращаться к request.user.
+    Версии областей служат и валидаторами условного GET.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            versions = get_versions(resolve_scopes(scopes, kwargs))
+            prefix = '.'.join(str(version) for version in versions)
+            cached_view = cache_page(timeout, key_prefix=prefix)(view)
+
+            def get_response():
+                request.page_cache_holes = True
+                response = cached_view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    fill_holes(request, response)
+                return response
+
+            return respond_conditionally(request, versions, get_response)
+        return wrapper
+    return decorator
@@ -0,0 +1,190 @@
+import heapq
+from itertools import islice
+from operator import itemgetter
+
+from django.core.paginator import Paginator
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по паре (дата, id) без COUNT(*) и OFFSET.
+
+    Страница задаётся непрозрачным курсором: ``after`` ведёт к более
+    старым записям, ``before`` - к более новым; с ``ascending`` -
+    наоборот, записи идут от старых к новым. Любая страница стоит
+    столько же, сколько первая.
+    """
+
+    # Старые ссылки ?page=N дальше этой страницы ведут на первую; None -
+    # без ограничения: номер переводится в курсор одной строкой по
+    # индексу с OFFSET.
+    legacy_page_limit = None
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 id_field='pk', ascending=False):
+        super().__init__(object_list, per_page)
+        self.date_field = date_field
+        self.id_field = id_field
+        self.ascending = ascending
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    def encode_cursor(self, key):
+        date, pk = key
+        return urlsafe_base64_encode(force_bytes(f'{date.isoformat()}|{pk}'))
+
+    def decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            date, pk = force_str(urlsafe_base64_decode(token)).split('|')
+            date = parse_datetime(date)
+            pk = int(pk)
+        except ValueError:
+            return None
+        if date is None:
+            return None
+        return date, pk
+
+    def _slice(self, queryset, id_field, cursor, newer):
+        """Queryset за курсором в порядке обхода."""
+        field = self.date_field
+        forward = newer != self.ascending
+        lookup, order = ('gt', '') if forward else ('lt', '-')
+        if cursor is not None:
+            date, pk = cursor
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': date})
+                | Q(**{field: date, f'{id_field}__{lookup}': pk})
+            )
+        return queryset.order_by(f'{order}{field}', f'{order}{id_field}')
+
+    def _key(self, obj, id_field):
+        return getattr(obj, self.date_field), getattr(obj, id_field)
+
+    def _fetch(self, cursor, newer, limit):
+        """Пары (ключ, объект) за курсором, не больше ``limit``."""
+        rows = self._slice(self.object_list, self.id_field, cursor, newer)
+        return [(self._key(obj, self.id_field), obj) for obj in rows[:limit]]
+
+    def get_cursor_page(self, after=None, before=None):
+        """Возвращает страницу, соседнюю с курсором, или первую."""
+        limit = self.per_page + 1
+        rows = []
+        has_newer = has_older = False
+        before_cursor = self.decode_cursor(before)
+        after_cursor = self.decode_cursor(after)
+        if before_cursor is not None:
+            rows = self._fetch(before_cursor, True, limit)
+            has_newer = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_older = True
+        if not rows and after_cursor is not None:
+            rows = self._fetch(after_cursor, False, limit)
+            has_older = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_newer = True
+        elif not rows:
+            rows = self._fetch(None, False, limit)
+            has_older = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        if rows and has_newer:
+            self.previous_cursor = self.encode_cursor(rows[0][0])
+        if rows and has_older:
+            self.next_cursor = self.encode_cursor(rows[-1][0])
+        return self._get_page([obj for _, obj in rows], 1, self)
+
+    def _legacy_key(self, offset):
+        rows = self._slice(self.object_list, self.id_field, None, False)
+        rows = list(rows[offset - 1:offset])
+        if not rows:
+            return None
+        return self._key(rows[0], self.id_field)
+
+    def get_legacy_cursor(self, number):
+        """Курсор ``after``, соответствующий старой ссылке ``?page=N``.
+
+        Для первой, несуществующей или некорректной страницы
+        возвращает None.
+        """
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return None
+        limit = self.legacy_page_limit
+        if number <= 1 or limit is not None and number > limit:
+            return None
+        offset = (number - 1) * self.per_page
+        # Столько строк не бывает, а OFFSET больше BIGINT база не примет.
+        if offset >= 2 ** 63:
+            return None
+        key = self._legacy_key(offset)
+        if key is None:
+            return None
+        return self.encode_cursor(key)
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Курсорная пагинация по k-way слиянию нескольких источников.
+
+    ``sources`` - список пар (queryset, поле id); каждый источник
+    читается по своему индексу (дата, id) не дальше одной страницы.
+    """
+
+    # Номер старой ссылки переводится в курсор слиянием всех источников
+    # до нужной записи, поэтому дальние страницы не открываются.
+    legacy_page_limit = 50
+
+    def __init__(self, sources, per_page, date_field='pub_date'):
+        super().__init__(sources, per_page, date_field=date_field)
+
+    def _fetch(self, cursor, newer, limit):
+        runs = [
+            [
+                (self._key(obj, id_field), obj)
+                for obj in self._slice(queryset, id_field, cursor, newer)
+                [:limit]
+            ]
+            for queryset, id_field in self.object_list
+        ]
+        merged = heapq.merge(*runs, key=itemgetter(0), reverse=not newer)
+        return list(islice(merged, limit))
+
+    def _legacy_key(self, offset):
+        # Только ключи (дата, id), без объектов и связанных таблиц.
+        runs = [
+            self._slice(queryset, id_field, None, False).values_list(
+                self.date_field, id_field
+            )[:offset]
+            for queryset, id_field in self.object_list
+        ]
+        keys = list(islice(heapq.merge(*runs, reverse=True), offset))
+        if len(keys) < offset:
+            return None
+        return keys[-1]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator без точного COUNT(*) по большим таблицам.
+
+    Для всей таблицы число строк оценивается по наибольшему ключу, для
+    выборки с условиями считается не дальше ``count_limit`` строк:
+    страниц дальше этой границы не видно, но и цена подсчёта не растёт
+    с таблицей.
+    """
+
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = queryset.model._default_manager.aggregate(
+                estimate=Max('pk')
+            )['estimate']
+            return estimate or 0
+        return queryset.order_by()[:self.count_limit].count()
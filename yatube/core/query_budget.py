@@ -0,0 +1,60 @@
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class QueryRecorder:
+    """Обёртка execute_wrapper: запоминает SQL и стек каждого запроса."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        stack = [
+            frame for frame in traceback.extract_stack()[:-1]
+            if frame.filename.startswith(settings.BASE_DIR)
+            and frame.filename != __file__
+        ]
+        self.queries.append((sql, params, stack))
+        return execute(sql, params, many, context)
+
+    def duplicates(self):
+        """SQL-шаблоны, выполненные больше одного раза."""
+        counts = Counter(sql for sql, _, _ in self.queries)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+    def report(self):
+        duplicates = self.duplicates()
+        lines = []
+        for number, (sql, params, stack) in enumerate(self.queries, 1):
+            marker = ' [повтор]' if sql in duplicates else ''
+            lines.append(f'{number}.{marker} {sql} {params!r}')
+            lines.extend(
+                f'      {line}'
+                for line in ''.join(traceback.format_list(stack)).splitlines()
+            )
+        return '\n'.join(lines)
+
+
+@contextmanager
+def query_budget(max_queries, max_duplicates=0, using=DEFAULT_DB_ALIAS):
+    """Падает, если блок выполнил больше запросов, чем разрешено.
+
+    ``max_duplicates`` ограничивает число лишних повторов одного и того
+    же SQL-шаблона - так ловятся N+1. В сообщении об ошибке перечислены
+    все запросы со стеками вызовов из кода проекта.
+    """
+    recorder = QueryRecorder()
+    with connections[using].execute_wrapper(recorder):
+        yield recorder
+    total = len(recorder.queries)
+    repeated = sum(count - 1 for count in recorder.duplicates().values())
+    if total > max_queries or repeated > max_duplicates:
+        raise AssertionError(
+            f'Превышен бюджет запросов: {total} из {max_queries}, '
+            f'повторов {repeated} из {max_duplicates}\n'
+            f'{recorder.report()}'
+        )
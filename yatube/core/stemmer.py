@@ -0,0 +1,126 @@
+"""Стеммер Портера (Snowball) для русского языка.
+
+Повторяет алгоритм https://snowballstem.org/algorithms/russian/stemmer.html:
+окончания снимаются только в области RV, словообразовательные суффиксы -
+в R2.
+"""
+
+VOWELS = frozenset('аеиоуыэюя')
+
+
+def _suffixes(*words):
+    # Самое длинное окончание проверяется первым.
+    return tuple(sorted(words, key=len, reverse=True))
+
+
+PERFECTIVE_GERUND_1 = _suffixes('в', 'вши', 'вшись')
+PERFECTIVE_GERUND_2 = _suffixes('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись')
+ADJECTIVE = _suffixes(
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им',
+    'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая',
+    'яя', 'ою', 'ею',
+)
+PARTICIPLE_1 = _suffixes('ем', 'нн', 'вш', 'ющ', 'щ')
+PARTICIPLE_2 = _suffixes('ивш', 'ывш', 'ующ')
+REFLEXIVE = _suffixes('ся', 'сь')
+VERB_1 = _suffixes(
+    'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+    'ют', 'ны', 'ть', 'ешь', 'нно',
+)
+VERB_2 = _suffixes(
+    'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+    'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+    'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+)
+NOUN = _suffixes(
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+    'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+    'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+)
+SUPERLATIVE = _suffixes('ейш', 'ейше')
+DERIVATIONAL = _suffixes('ост', 'ость')
+
+
+def _regions(word):
+    """Начала областей RV и R2."""
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word, suffixes, start):
+    """Снимает первое подходящее окончание, не заходя левее ``start``."""
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= start:
+            return word[:-len(suffix)]
+    return None
+
+
+def _strip_grouped(word, group_1, group_2, start):
+    """Окончания первой группы снимаются только после «а» или «я»."""
+    for suffix in _suffixes(*group_1, *group_2):
+        if not word.endswith(suffix) or len(word) - len(suffix) < start:
+            continue
+        stem = word[:-len(suffix)]
+        if suffix in group_2:
+            return stem
+        if stem.endswith(('а', 'я')) and len(stem) - 1 >= start:
+            return stem
+    return None
+
+
+def _strip_adjectival(word, start):
+    stem = _strip(word, ADJECTIVE, start)
+    if stem is None:
+        return None
+    participle = _strip_grouped(stem, PARTICIPLE_1, PARTICIPLE_2, start)
+    return stem if participle is None else participle
+
+
+def stem(word):
+    """Основа слова в нижнем регистре."""
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+    # Шаг 1.
+    result = _strip_grouped(
+        word, PERFECTIVE_GERUND_1, PERFECTIVE_GERUND_2, rv
+    )
+    if result is None:
+        word = _strip(word, REFLEXIVE, rv) or word
+        result = (
+            _strip_adjectival(word, rv)
+            or _strip_grouped(word, VERB_1, VERB_2, rv)
+            or _strip(word, NOUN, rv)
+        )
+    if result is not None:
+        word = result
+    # Шаг 2.
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    # Шаг 3.
+    word = _strip(word, DERIVATIONAL, r2) or word
+    # Шаг 4.
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    superlative = _strip(word, SUPERLATIVE, rv)
+    if superlative is not None:
+        word = superlative
+        if word.endswith('нн') and len(word) - 2 >= rv:
+            word = word[:-1]
+        return word
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
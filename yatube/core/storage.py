@@ -0,0 +1,60 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_name(directory, digest, ext):
+    """Путь файла по хэшу содержимого: ``posts/ab/cd/<sha256>.jpg``."""
+    return posixpath.join(
+        directory, digest[:2], digest[2:4], f'{digest}{ext.lower()}'
+    )
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором одинаковые файлы лежат в одном экземпляре.
+
+    Имя файла - sha256 содержимого, посчитанный при записи; каталог из
+    ``upload_to`` разбит на подкаталоги по первым байтам хэша, чтобы в
+    одном каталоге не копились миллионы файлов. Файл с уже известным
+    содержимым повторно не записывается.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя означает одинаковое содержимое, так что
+        # подбирать свободное имя не нужно.
+        return name
+
+    def _save(self, name, content):
+        directory, filename = posixpath.split(name)
+        ext = os.path.splitext(filename)[1]
+        upload_dir = self.path(directory)
+        os.makedirs(upload_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=upload_dir, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            name = content_name(directory, digest.hexdigest(), ext)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.remove(temp_path)
+                # Свежее время изменения не даёт сборщику мусора
+                # удалить файл, пока пост с ним ещё не сохранён.
+                os.utime(full_path)
+                return name
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
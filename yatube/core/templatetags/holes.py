@@ -0,0 +1,19 @@
+from core import page_cache
+from django import template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **params):
+    """Персональный фрагмент, не попадающий в общий кэш страницы.
+
+    На страницах под versioned_cache_page выводит метку, которая
+    заполняется для каждого запроса; на остальных рисует фрагмент сразу.
+    Фрагмент видит только ``params`` и данные context processors.
+    """
+    request = context.get('request')
+    if getattr(request, 'page_cache_holes', False):
+        return mark_safe(page_cache.hole_marker(template_name, params))
+    return page_cache.render_hole(request, template_name, params)
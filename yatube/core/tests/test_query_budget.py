@@ -0,0 +1,172 @@
+import shutil
+import tempfile
+
+from about import urls as about_urls
+from core.query_budget import query_budget
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from posts import urls as posts_urls
+from posts.models import Comment, Follow, Group, Post
+from users import urls as users_urls
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+# Имя URL -> (требуется вход, максимум запросов, максимум повторов).
+# Миниатюры страницы читаются из KV-хранилища sorl одним запросом.
+# Поиск читает вхождения отдельным запросом на каждое слово запроса.
+BUDGETS = {
+    'posts:index': (False, 2, 0),
+    'posts:post_create': (True, 3, 0),
+    'posts:group_list': (False, 3, 0),
+    'posts:profile': (False, 3, 0),
+    'posts:search': (False, 6, 1),
+    'posts:post_detail': (False, 4, 0),
+    'posts:post_comments': (False, 1, 0),
+    'posts:comment_thread': (False, 2, 0),
+    'posts:post_edit': (True, 4, 0),
+    'posts:add_comment': (True, 3, 0),
+    'posts:follow_index': (True, 5, 0),
+    'posts:profile_follow': (True, 12, 0),
+    'posts:profile_unfollow': (True, 8, 0),
+    'users:signup': (False, 0, 0),
+    'users:logout': (True, 4, 0),
+    'users:login': (False, 0, 0),
+    'users:password_change': (True, 2, 0),
+    'users:password_change_done': (True, 2, 0),
+    'users:password_reset_form': (False, 0, 0),
+    'users:password_reset_done': (False, 0, 0),
+    'users:password_reset_confirm': (False, 1, 0),
+    'users:reset_done': (False, 0, 0),
+    'about:author': (False, 0, 0),
+    'about:tech': (False, 0, 0),
+}
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTest(TestCase):
+    """Бюджет SQL-запросов для каждого URL проекта."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author_{i}',
+                first_name=f'Имя {i}',
+                last_name=f'Фамилия {i}',
+            )
+            for i in range(4)
+        ]
+        cls.user = cls.authors[0]
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {i}', slug=f'group_{i}', description='...'
+            )
+            for i in range(3)
+        ]
+        cls.posts = []
+        for i in range(25):
+            image = ''
+            if i % 3 == 0:
+                image = SimpleUploadedFile(
+                    name=f'budget_{i}.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif',
+                )
+            cls.posts.append(Post.objects.create(
+                author=cls.authors[i % len(cls.authors)],
+                group=cls.groups[i % len(cls.groups)],
+                text=f'Пост номер {i}',
+                image=image,
+            ))
+        # В TestCase фоновые миниатюры не запускаются, а бюджет должен
+        # учитывать чтение уже готовых.
+        Post.objects.exclude(image='').update(thumbnails_ready=True)
+        cls.post = cls.posts[-1]
+        for i, post in enumerate(cls.posts):
+            for commenter in cls.authors[:i % 5]:
+                Comment.objects.create(
+                    post=post, author=commenter, text=f'Комментарий {i}'
+                )
+        # Ветка глубже, чем показывается сразу.
+        cls.thread_root = parent = None
+        for depth in range(6):
+            parent = Comment.objects.create(
+                post=cls.post, author=cls.authors[depth % 4],
+                text=f'Ответ {depth}', parent=parent,
+            )
+            cls.thread_root = cls.thread_root or parent
+        for author in cls.authors[1:]:
+            Follow.objects.create(user=cls.user, author=author)
+        cls.url_kwargs = {
+            'posts:group_list': {'slug': cls.groups[0].slug},
+            'posts:profile': {'username': cls.authors[1].username},
+            'posts:post_detail': {'post_id': cls.post.pk},
+            'posts:post_comments': {'post_id': cls.post.pk},
+            'posts:comment_thread': {
+                'post_id': cls.post.pk, 'comment_id': cls.thread_root.pk,
+            },
+            'posts:post_edit': {'post_id': cls.post.pk},
+            'posts:add_comment': {'post_id': cls.post.pk},
+            'posts:profile_follow': {'username': cls.authors[1].username},
+            'posts:profile_unfollow': {'username': cls.authors[1].username},
+            'users:password_reset_confirm': {
+                'uidb64': urlsafe_base64_encode(force_bytes(cls.user.pk)),
+                'token': default_token_generator.make_token(cls.user),
+            },
+        }
+        cls.url_params = {
+            'posts:search': {'q': 'пост номер'},
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_every_url_has_budget(self):
+        """Для каждого именованного URL объявлен бюджет запросов."""
+        for module in (posts_urls, users_urls, about_urls):
+            for pattern in module.urlpatterns:
+                with self.subTest(name=pattern.name):
+                    self.assertIn(f'{module.app_name}:{pattern.name}', BUDGETS)
+
+    def get_client(self, login):
+        client = Client()
+        if login:
+            client.force_login(self.user)
+        return client
+
+    def test_query_budgets(self):
+        """Страницы не выходят за бюджет запросов и повторов."""
+        for name, (login, _, _) in BUDGETS.items():
+            url = reverse(name, kwargs=self.url_kwargs.get(name))
+            self.get_client(login).get(url, self.url_params.get(name))
+        for name, (login, max_queries, max_duplicates) in BUDGETS.items():
+            url = reverse(name, kwargs=self.url_kwargs.get(name))
+            client = self.get_client(login)
+            cache.clear()
+            with self.subTest(url=name):
+                with query_budget(max_queries, max_duplicates):
+                    client.get(url, self.url_params.get(name))
@@ -1,6 +1,8 @@
+from core.pagination import EstimatedCountPaginator
 from django.contrib import admin
 
-from .models import Group, Post
+from .models import Group, Post, SearchTerm
+from .search import terms
 
 
 @admin.register(Post)
@@ -12,14 +14,35 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    autocomplete_fields = ('author', 'group')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по поисковому индексу, а не LIKE по всей таблице.
+
+        Как и обычный поиск админки по всем словам, находит посты со
+        всеми основами запроса, без отбора лучших по рангу. Пока индекс
+        пуст или в запросе одни стоп-слова, ищет по-старому.
+        """
+        query_terms = set(terms(search_term))
+        if not query_terms or not SearchTerm.objects.exists():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        for term in query_terms:
+            queryset = queryset.filter(search_entries__term=term)
+        return queryset, False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
-    list_display = ('title', 'description')
+    list_display = ('title', 'description', 'posts_count')
     search_fields = ('title',)
-    list_filter = ('title',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,116 @@
+from django.db.models import (Count, F, OuterRef, Subquery, TextField,
+                              Value)
+from django.db.models.functions import Coalesce, Concat
+
+from .models import (Comment, Follow, Group, ImageBlob, Post, SearchEntry,
+                     SearchTerm, User, UserStats)
+from .threads import PATH_END
+
+
+def count_of(model, field, outer='pk'):
+    """Подзапрос с числом строк ``model``, ссылающихся на внешнюю запись."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer)})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def _change(queryset, field, delta):
+    """Сдвигает счётчик, не опуская его ниже нуля при рассинхронизации."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def change_user_counter(user_id, field, delta):
+    _change(UserStats.objects.filter(user_id=user_id), field, delta)
+
+
+def change_group_counter(group_id, delta):
+    if group_id is not None:
+        _change(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def change_post_counter(post_id, delta):
+    _change(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def change_image_refcount(name, delta):
+    if not name:
+        return
+    if delta > 0:
+        ImageBlob.objects.bulk_create(
+            [ImageBlob(name=name)], ignore_conflicts=True
+        )
+    _change(ImageBlob.objects.filter(name=name), 'refcount', delta)
+
+
+def recount_users(user_ids):
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    return UserStats.objects.filter(user_id__in=user_ids).update(
+        posts_count=count_of(Post, 'author', 'user_id'),
+        followers_count=count_of(Follow, 'author', 'user_id'),
+        following_count=count_of(Follow, 'user', 'user_id'),
+    )
+
+
+def recount_groups(group_ids):
+    return Group.objects.filter(pk__in=group_ids).update(
+        posts_count=count_of(Post, 'group'),
+    )
+
+
+def recount_posts(post_ids):
+    return Post.objects.filter(pk__in=post_ids).update(
+        comments_count=count_of(Comment, 'post'),
+    )
+
+
+def recount_comments(comment_ids):
+    replies = (
+        Comment.objects.filter(
+            post_id=OuterRef('post_id'),
+            path__gt=OuterRef('path'),
+            path__lt=Concat(
+                OuterRef('path'), Value(PATH_END), output_field=TextField()
+            ),
+        )
+        .order_by()
+        .values('post_id')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Comment.objects.filter(pk__in=comment_ids).update(
+        replies_count=Coalesce(Subquery(replies), 0),
+    )
+
+
+def recount_images(names):
+    return ImageBlob.objects.filter(name__in=names).update(
+        refcount=count_of(Post, 'image', 'name'),
+    )
+
+
+def recount_search_terms(names):
+    return SearchTerm.objects.filter(term__in=names).update(
+        posts_count=count_of(SearchEntry, 'term', 'term'),
+    )
+
+
+RECOUNTERS = (
+    (User, recount_users),
+    (Group, recount_groups),
+    (Post, recount_posts),
+    (Comment, recount_comments),
+    (ImageBlob, recount_images),
+    (SearchTerm, recount_search_terms),
+)
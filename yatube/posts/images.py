@@ -0,0 +1,139 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Ключи Image.info, которые не несут сведений о съёмке и авторе.
+SAFE_INFO = frozenset({
+    'adobe', 'adobe_transform', 'aspect', 'background', 'dpi', 'duration',
+    'gamma', 'icc_profile', 'interlace', 'jfif', 'jfif_density',
+    'jfif_unit', 'jfif_version', 'loop', 'progression', 'progressive',
+    'srgb', 'transparency', 'version',
+})
+KEPT_FORMATS = ('GIF', 'JPEG', 'PNG', 'WEBP')
+# Шаг уменьшения, если и минимальное качество не укладывается в бюджет.
+SHRINK_STEP = 0.75
+# Дальше уменьшать бессмысленно: такой файл меньше любого бюджета.
+MIN_SIDE = 16
+
+
+def needs_reencoding(image, size):
+    if image.format not in KEPT_FORMATS:
+        return True
+    if max(image.size) > settings.IMAGE_MAX_SIDE:
+        return True
+    if size > settings.IMAGE_STORED_MAX_SIZE:
+        return True
+    return bool(set(image.info) - SAFE_INFO or image.getexif())
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def encode(image, alpha):
+    """Байты картинки в JPEG или, с прозрачностью, в PNG.
+
+    Перебирает качество JPEG от IMAGE_JPEG_QUALITY вниз, затем уменьшает
+    картинку, пока файл не уложится в IMAGE_STORED_MAX_SIZE.
+    """
+    budget = settings.IMAGE_STORED_MAX_SIZE
+    icc_profile = image.info.get('icc_profile')
+    if not alpha:
+        image = image.convert('RGB')
+    while True:
+        if alpha:
+            qualities = [None]
+        else:
+            qualities = range(
+                settings.IMAGE_JPEG_QUALITY,
+                settings.IMAGE_JPEG_MIN_QUALITY - 1,
+                -10,
+            )
+        for quality in qualities:
+            buffer = BytesIO()
+            if alpha:
+                image.save(buffer, 'PNG', optimize=True)
+            else:
+                image.save(
+                    buffer,
+                    'JPEG',
+                    quality=quality,
+                    optimize=True,
+                    progressive=True,
+                    icc_profile=icc_profile,
+                )
+            if buffer.tell() <= budget:
+                return buffer.getvalue()
+        if max(image.size) * SHRINK_STEP < MIN_SIDE:
+            return buffer.getvalue()
+        image = image.resize(
+            (
+                max(1, round(image.width * SHRINK_STEP)),
+                max(1, round(image.height * SHRINK_STEP)),
+            ),
+            Image.LANCZOS,
+        )
+
+
+def normalize_image(upload):
+    """Проверяет загруженную картинку и приводит её к бюджету.
+
+    Файлы и картинки больше предела безопасности отклоняются до
+    распаковки пикселей. Картинки больше IMAGE_MAX_SIDE уменьшаются,
+    EXIF и прочие метаданные удаляются перекодированием, результат
+    укладывается в IMAGE_STORED_MAX_SIZE. Чистые картинки в пределах
+    бюджета возвращаются как есть, без потери качества.
+    """
+    if upload.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            code='file_too_large',
+            params={'limit': settings.IMAGE_UPLOAD_MAX_SIZE // 2 ** 20},
+        )
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)d мегапикселей.',
+            code='too_many_pixels',
+            params={'limit': settings.IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+    side = settings.IMAGE_MAX_SIDE
+    if getattr(image, 'is_animated', False):
+        # Кадры анимации не перекодируются, поэтому её размер только
+        # проверяется.
+        if max(width, height) > side:
+            raise ValidationError(
+                'Анимация больше %(limit)d пикселей по стороне.',
+                code='animation_too_large',
+                params={'limit': side},
+            )
+        if upload.size > settings.IMAGE_STORED_MAX_SIZE:
+            raise ValidationError(
+                'Анимация больше %(limit)d МБ.',
+                code='animation_too_large',
+                params={'limit': settings.IMAGE_STORED_MAX_SIZE // 2 ** 20},
+            )
+        upload.seek(0)
+        return upload
+    if not needs_reencoding(image, upload.size):
+        upload.seek(0)
+        return upload
+    # JPEG сразу декодируется в уменьшенном масштабе.
+    image.draft('RGB', (side, side))
+    image = ImageOps.exif_transpose(image)
+    image.info = {
+        key: value for key, value in image.info.items() if key in SAFE_INFO
+    }
+    image.thumbnail((side, side), Image.LANCZOS)
+    alpha = has_alpha(image)
+    ext = '.png' if alpha else '.jpg'
+    name = os.path.splitext(os.path.basename(upload.name))[0] + ext
+    return ContentFile(encode(image, alpha), name=name)
@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import time
+from collections import Counter
+
+from core import page_cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+from posts.models import Post
+from posts.thumbnails import backfill_image
+
+PLACEHOLDER_FIELDS = ('image_width', 'image_height', 'image_placeholder')
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт недостающие миниатюры всех картинок постов в пуле '
+        'процессов. Готовые миниатюры пропускаются, поэтому прерванный '
+        'запуск можно просто повторить.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count(),
+            help='Число процессов; 1 - без пула, в текущем процессе',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько картинок читать из базы за раз',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        images = Post.objects.exclude(image='').order_by('pk').values_list(
+            'pk', 'image', 'image_placeholder'
+        )
+        stats = Counter()
+        started = time.perf_counter()
+        pool = None
+        if options['processes'] > 1:
+            # Дочерние процессы не должны делить соединения родителя.
+            connections.close_all()
+            pool = multiprocessing.Pool(options['processes'])
+        try:
+            # Пачки по pk, а не один курсор .iterator(): открытое чтение
+            # в SQLite не даёт процессам записать миниатюры в KV.
+            batch = list(images[:batch_size])
+            while batch:
+                self.process(pool, batch, stats, started)
+                batch = list(images.filter(pk__gt=batch[-1][0])[:batch_size])
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        elapsed = time.perf_counter() - started
+        total = sum(stats.values())
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Картинок: {total}, создано: {stats["generated"]}, '
+            f'пропущено: {stats["skipped"]}, ошибок: {stats["failed"]}, '
+            f'{rate:.1f} картинок/с'
+        )
+
+    def process(self, pool, batch, stats, started):
+        items = [
+            (pk, image_name, bool(placeholder))
+            for pk, image_name, placeholder in batch
+        ]
+        if pool is None:
+            results = list(map(backfill_image, items))
+        else:
+            results = pool.map(backfill_image, items)
+        stats.update(status for _, status, _ in results)
+        described = []
+        for pk, status, fields in results:
+            if fields is not None:
+                described.append(Post(pk=pk, thumbnails_ready=True, **fields))
+        Post.objects.bulk_update(
+            described, ['thumbnails_ready', *PLACEHOLDER_FIELDS]
+        )
+        ready = [pk for pk, status, _ in results if status != 'failed']
+        updated = Post.objects.filter(
+            pk__in=ready, thumbnails_ready=False
+        ).update(thumbnails_ready=True)
+        if updated or described:
+            page_cache.bump('posts', 'groups')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Обработано {sum(stats.values())} картинок '
+            f'(до pk={batch[-1][0]}), '
+            f'{sum(stats.values()) / elapsed:.1f} картинок/с'
+        )
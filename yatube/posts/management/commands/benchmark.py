@@ -0,0 +1,240 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from faker import Faker
+from mixer.backend.django import mixer
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def percentile(values, fraction):
+    """Процентиль по методу ближайшего ранга для отсортированного списка."""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон основных страниц: наполняет базу данными, '
+        'гоняет запросы из пула клиентов и печатает p50/p95/p99, '
+        'запросы в секунду и SQL-запросы на запрос в JSON.'
+    )
+
+    scenarios = (
+        'index',
+        'group_posts',
+        'profile',
+        'post_detail',
+        'follow_index',
+        'post_create',
+        'add_comment',
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=300)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Число запросов на каждый сценарий',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Число одновременно работающих клиентов',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--scenario', action='append', choices=self.scenarios,
+            help='Прогнать только указанные сценарии',
+        )
+        parser.add_argument(
+            '--current-db', action='store_true',
+            help='Работать с настроенной базой вместо временной тестовой',
+        )
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+
+    def handle(self, *args, **options):
+        old_name = None
+        if not options['current_db']:
+            if connection.vendor == 'sqlite':
+                # Общая in-memory база SQLite блокирует таблицы целиком,
+                # поэтому параллельным клиентам нужен файл.
+                connection.settings_dict['TEST']['NAME'] = os.path.join(
+                    tempfile.gettempdir(), 'yatube_benchmark.sqlite3'
+                )
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False
+            )
+        try:
+            with override_settings(DEBUG=False):
+                self.seed(options)
+                report = self.run(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        self.stdout.write(output)
+
+    def seed(self, options):
+        random.seed(options['seed'])
+        mixer.faker.seed_instance(options['seed'])
+        fake = Faker('ru_RU')
+        fake.seed_instance(options['seed'])
+
+        users = mixer.cycle(options['users']).blend(
+            User,
+            username=(f'bench_user_{i}' for i in range(options['users'])),
+            first_name=fake.first_name,
+            last_name=fake.last_name,
+        )
+        groups = mixer.cycle(options['groups']).blend(
+            Group,
+            slug=(f'bench-group-{i}' for i in range(options['groups'])),
+            title=fake.catch_phrase,
+            description=fake.paragraph,
+        )
+        posts = mixer.cycle(options['posts']).blend(
+            Post,
+            author=(random.choice(users) for _ in range(options['posts'])),
+            group=(
+                random.choice(groups + [None])
+                for _ in range(options['posts'])
+            ),
+            text=fake.paragraph,
+            image='',
+        )
+        mixer.cycle(options['comments']).blend(
+            Comment,
+            post=(random.choice(posts) for _ in range(options['comments'])),
+            author=(
+                random.choice(users) for _ in range(options['comments'])
+            ),
+            text=fake.sentence,
+        )
+        pairs = set()
+        limit = min(options['follows'], len(users) * (len(users) - 1))
+        while len(pairs) < limit:
+            user, author = random.sample(users, 2)
+            pairs.add((user, author))
+        for user, author in pairs:
+            Follow.objects.create(user=user, author=author)
+
+    def request(self, scenario, client, rnd, data):
+        if scenario == 'index':
+            return client.get(reverse('posts:index'))
+        if scenario == 'group_posts':
+            return client.get(reverse(
+                'posts:group_list', args=[rnd.choice(data['groups'])]
+            ))
+        if scenario == 'profile':
+            return client.get(reverse(
+                'posts:profile', args=[rnd.choice(data['usernames'])]
+            ))
+        if scenario == 'post_detail':
+            return client.get(reverse(
+                'posts:post_detail', args=[rnd.choice(data['posts'])]
+            ))
+        if scenario == 'follow_index':
+            return client.get(reverse('posts:follow_index'))
+        if scenario == 'post_create':
+            return client.post(reverse('posts:post_create'), {
+                'text': f'Пост нагрузочного теста {rnd.random()}',
+                'group': rnd.choice(data['group_ids']),
+            })
+        return client.post(
+            reverse('posts:add_comment', args=[rnd.choice(data['posts'])]),
+            {'text': f'Комментарий нагрузочного теста {rnd.random()}'},
+        )
+
+    def run(self, options):
+        data = {
+            'groups': list(Group.objects.values_list('slug', flat=True)),
+            'group_ids': list(Group.objects.values_list('pk', flat=True)),
+            'usernames': list(User.objects.values_list('username', flat=True)),
+            'posts': list(Post.objects.values_list('pk', flat=True)),
+        }
+        users = list(User.objects.all())
+        cache.clear()
+        report = {
+            'params': {
+                key: options[key] for key in (
+                    'users', 'groups', 'posts', 'comments', 'follows',
+                    'requests', 'concurrency', 'seed',
+                )
+            },
+            'scenarios': {},
+        }
+        for scenario in options['scenario'] or self.scenarios:
+            report['scenarios'][scenario] = self.run_scenario(
+                scenario, options, data, users
+            )
+        return report
+
+    def run_scenario(self, scenario, options, data, users):
+        local = threading.local()
+        lock = threading.Lock()
+        latencies = []
+        queries = []
+        errors = 0
+
+        def count_queries(execute, sql, params, many, context):
+            local.queries += 1
+            return execute(sql, params, many, context)
+
+        def task(number):
+            nonlocal errors
+            rnd = random.Random(f'{options["seed"]}-{scenario}-{number}')
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.force_login(rnd.choice(users))
+            local.queries = 0
+            with connection.execute_wrapper(count_queries):
+                started = time.perf_counter()
+                try:
+                    response = self.request(
+                        scenario, local.client, rnd, data
+                    )
+                    failed = response.status_code >= 400
+                except Exception:
+                    failed = True
+                elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed * 1000)
+                queries.append(local.queries)
+                errors += failed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            list(executor.map(task, range(options['requests'])))
+        wall = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'rps': round(len(latencies) / wall, 2),
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'queries_per_request': round(sum(queries) / len(queries), 2),
+        }
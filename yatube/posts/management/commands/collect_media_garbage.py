@@ -0,0 +1,146 @@
+import os
+import posixpath
+import time
+
+from django.core.management.base import BaseCommand
+from posts.models import ImageBlob, Post
+from posts.thumbnails import delete_image, image_files
+
+
+def walk(storage, directory, after=''):
+    """Имена файлов каталога хранилища по возрастанию, начиная после
+    ``after``.
+
+    Каталоги, целиком лежащие до ``after``, не читаются.
+    """
+    entries = []
+    with os.scandir(storage.path(directory)) as scanner:
+        for entry in scanner:
+            name = posixpath.join(directory, entry.name)
+            if entry.is_dir():
+                entries.append((name + '/', True))
+            else:
+                entries.append((name, False))
+    for name, is_dir in sorted(entries):
+        if not is_dir:
+            if name > after:
+                yield name
+        elif name > after or after.startswith(name):
+            yield from walk(storage, name, after)
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые больше не ссылается ни один '
+        'пост, вместе с их миниатюрами. Без ссылок - файлы с нулевым '
+        'счётчиком ImageBlob или без записи в нём; ссылки из Post.image '
+        'перепроверяются только у них. Файлы обходятся по порядку имён, '
+        'поэтому прерванный запуск можно продолжить с --after.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать, что было бы удалено',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько файлов проверять одним запросом к базе',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд: их пост может '
+                 'быть ещё не сохранён',
+        )
+        parser.add_argument(
+            '--max-rate',
+            type=float,
+            default=0,
+            help='Не больше стольких удалений в секунду; 0 - без ограничения',
+        )
+        parser.add_argument(
+            '--after',
+            default='',
+            help='Продолжить с файла, следующего за этим именем',
+        )
+
+    def handle(self, *args, **options):
+        storage = Post.image.field.storage
+        directory = Post.image.field.upload_to
+        if not storage.exists(directory):
+            self.stdout.write('Каталог картинок пуст')
+            return
+        self.options = options
+        self.stats = {'checked': 0, 'orphans': 0, 'freed': 0}
+        self.started = time.monotonic()
+        batch = []
+        for name in walk(storage, directory, options['after']):
+            batch.append(name)
+            if len(batch) == options['batch_size']:
+                self.process(batch)
+                batch = []
+        if batch:
+            self.process(batch)
+        prefix = 'Пробный запуск. ' if options['dry_run'] else ''
+        self.stdout.write(
+            f'{prefix}Файлов: {self.stats["checked"]}, '
+            f'без ссылок: {self.stats["orphans"]}, '
+            f'освобождено: {self.stats["freed"]} байт '
+            f'({self.stats["freed"] / 2 ** 20:.1f} МБ)'
+        )
+
+    def process(self, batch):
+        storage = Post.image.field.storage
+        counted = set(
+            ImageBlob.objects.filter(
+                name__in=batch, refcount__gt=0
+            ).values_list('name', flat=True)
+        )
+        # Счётчик мог разойтись с постами, поэтому файл удаляется, только
+        # если на него не ссылается и Post.image.
+        candidates = [name for name in batch if name not in counted]
+        referenced = set(
+            Post.objects.filter(image__in=candidates).values_list(
+                'image', flat=True
+            )
+        ) if candidates else set()
+        cutoff = time.time() - self.options['min_age']
+        orphans = []
+        for name in candidates:
+            if name in referenced:
+                continue
+            # Время проверяется после запроса: файл с тем же содержимым
+            # могли только что загрузить заново.
+            if os.path.getmtime(storage.path(name)) > cutoff:
+                continue
+            orphans.append(name)
+            if self.options['dry_run']:
+                self.stats['freed'] += sum(
+                    file.storage.size(file.name)
+                    for file in image_files(name)
+                )
+            else:
+                self.stats['freed'] += delete_image(name)
+                self.throttle(len(orphans))
+        if orphans and not self.options['dry_run']:
+            ImageBlob.objects.filter(name__in=orphans).delete()
+        self.stats['checked'] += len(batch)
+        self.stats['orphans'] += len(orphans)
+        self.stdout.write(
+            f'Проверено {self.stats["checked"]} файлов '
+            f'(до {batch[-1]}), без ссылок: {self.stats["orphans"]}'
+        )
+
+    def throttle(self, deleted_in_batch):
+        max_rate = self.options['max_rate']
+        if not max_rate:
+            return
+        deleted = self.stats['orphans'] + deleted_in_batch
+        delay = deleted / max_rate - (time.monotonic() - self.started)
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,103 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from posts.models import Comment, Follow, Group, Post
+from posts.transfer import dump_datetime, open_stream
+
+User = get_user_model()
+
+
+def records(batch_size):
+    """Записи выгрузки в порядке KINDS; ссылки - по username и slug."""
+    users = User.objects.order_by('pk').values_list(
+        'username', 'first_name', 'last_name', 'email', 'is_active',
+        'date_joined',
+    )
+    for username, first, last, email, active, joined in users.iterator(
+        chunk_size=batch_size
+    ):
+        yield {
+            'type': 'user', 'username': username, 'first_name': first,
+            'last_name': last, 'email': email, 'is_active': active,
+            'date_joined': dump_datetime(joined),
+        }
+    groups = Group.objects.order_by('pk').values_list(
+        'slug', 'title', 'description'
+    )
+    for slug, title, description in groups.iterator(chunk_size=batch_size):
+        yield {
+            'type': 'group', 'slug': slug, 'title': title,
+            'description': description,
+        }
+    posts = Post.objects.order_by('pk').values_list(
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date', 'image',
+        'image_width', 'image_height', 'image_placeholder',
+    )
+    for (pk, author, group, text, pub_date, image, width, height,
+         placeholder) in posts.iterator(chunk_size=batch_size):
+        yield {
+            'type': 'post', 'id': pk, 'author': author, 'group': group,
+            'text': text, 'pub_date': dump_datetime(pub_date),
+            'image': image, 'image_width': width, 'image_height': height,
+            'image_placeholder': placeholder,
+        }
+    # В порядке дерева: родитель всегда раньше ответов.
+    comments = Comment.objects.order_by('post', 'path').values_list(
+        'pk', 'post_id', 'parent_id', 'author__username', 'text', 'created',
+        'path', 'depth',
+    )
+    for (pk, post_id, parent_id, author, text, created, path,
+         depth) in comments.iterator(chunk_size=batch_size):
+        yield {
+            'type': 'comment', 'id': pk, 'post': post_id,
+            'parent': parent_id, 'author': author, 'text': text,
+            'created': dump_datetime(created), 'path': path, 'depth': depth,
+        }
+    follows = Follow.objects.order_by('pk').values_list(
+        'user__username', 'author__username'
+    )
+    for user, author in follows.iterator(chunk_size=batch_size):
+        yield {'type': 'follow', 'user': user, 'author': author}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в JSONL, по записи на строку. Строки читаются серверным курсором '
+        'и сразу пишутся, поэтому память не растёт с размером базы. '
+        'Файлы картинок не выгружаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл выгрузки; .gz - со сжатием, "-" - stdout',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Сколько строк читать из базы за раз',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = 0
+        with open_stream(options['path'], 'w') as stream:
+            for record in records(options['batch_size']):
+                stream.write(json.dumps(record, ensure_ascii=False))
+                stream.write('\n')
+                written += 1
+                if written % 100000 == 0:
+                    self.report(written, started)
+        self.report(written, started)
+
+    def report(self, written, started):
+        elapsed = time.perf_counter() - started
+        # При выгрузке в stdout отчёт не должен смешиваться с данными.
+        self.stderr.write(
+            f'Выгружено {written} записей, '
+            f'{written / max(elapsed, 1e-9):.1f} записей/с'
+        )
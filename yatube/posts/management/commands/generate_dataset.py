@@ -0,0 +1,372 @@
+import io
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+
+from core import page_cache
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+from posts import timeline
+from posts.models import (Comment, Follow, Group, ImageBlob, Post,
+                          UserStats)
+from posts.threads import segment
+from posts.transfer import raw_dates, reset_sequences
+
+User = get_user_model()
+
+# Глубже ветки почти не встречаются и только раздувают пути.
+MAX_THREAD_DEPTH = 8
+
+
+def zipf_weights(size, exponent):
+    """Накопленные веса закона Ципфа: k-й по популярности - 1 / k ** s."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+def heavy_tail(rnd, mean, alpha, limit):
+    """Целое из сдвинутого распределения Парето со средним около ``mean``.
+
+    У заметной доли значений ноль, у единиц - на порядки больше среднего.
+    """
+    value = (mean + 1) * (alpha - 1) / alpha * rnd.paretovariate(alpha) - 1
+    return min(int(value), limit)
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими данными со степенными '
+        'распределениями: популярность авторов по закону Ципфа, '
+        'несколько знаменитостей с огромным числом подписчиков, '
+        'тяжёлый хвост числа комментариев. Строки вставляются пачками '
+        'через bulk_create; одно и то же зерно на пустой базе даёт одни '
+        'и те же данные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument(
+            '--comments', type=float, default=3,
+            help='Среднее число комментариев на пост',
+        )
+        parser.add_argument(
+            '--follows', type=float, default=20,
+            help='Среднее число подписок на пользователя',
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель закона Ципфа для популярности авторов',
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.5,
+            help='Показатель Парето для числа комментариев и подписок; '
+                 'чем меньше, тем тяжелее хвост',
+        )
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Сколько разных картинок сгенерировать',
+        )
+        parser.add_argument(
+            '--image-share', type=float, default=0.1,
+            help='Доля постов с картинкой, если --images больше нуля',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до --end распределены посты',
+        )
+        parser.add_argument(
+            '--end', default='2020-01-01',
+            help='Дата последнего поста; фиксирована ради воспроизводимости',
+        )
+        parser.add_argument(
+            '--celebrity-threshold', type=int,
+            help='Порог подписчиков для reclassify_authors; по умолчанию '
+                 'сотая часть --users, как у боевого порога на боевой '
+                 'аудитории. Без знаменитостей ленты популярных авторов '
+                 'разрастаются квадратично',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='gen_',
+            help='Префикс имён пользователей и слагов групп',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Сколько строк вставлять одним bulk_create',
+        )
+        parser.add_argument(
+            '--skip-rebuild',
+            action='store_true',
+            help='Не пересчитывать счётчики и поисковый индекс; тогда '
+                 'нужно запустить recount и rebuild_search_index вручную',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        if User.objects.filter(
+            username__startswith=options['prefix']
+        ).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {options["prefix"]} уже есть; '
+                f'задайте другой --prefix'
+            )
+        self.options = options
+        self.rnd = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.started = time.perf_counter()
+
+        user_ids = self.generate_users()
+        group_ids = self.generate_groups()
+        # Чем меньше ранг, тем популярнее пользователь и как автор,
+        # и как цель подписки.
+        self.popularity = zipf_weights(len(user_ids), options['zipf'])
+        images = self.generate_images()
+        with raw_dates():
+            self.generate_posts(user_ids, group_ids, images)
+        reset_sequences(Post, Comment)
+        self.generate_follows(user_ids)
+
+        threshold = options['celebrity_threshold']
+        if threshold is None:
+            threshold = max(2, options['users'] // 100)
+        call_command(
+            'reclassify_authors', threshold=threshold, stdout=self.stdout
+        )
+        self.fill_timelines()
+        if not options['skip_rebuild']:
+            call_command('recount', stdout=self.stdout)
+            call_command('rebuild_search_index', stdout=self.stdout)
+        page_cache.bump('posts', 'groups')
+
+    def report(self, name, count):
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(
+            f'{name}: {count}, {elapsed:.1f} с от начала'
+        )
+
+    def generate_users(self):
+        options = self.options
+        first_names = [self.fake.first_name() for _ in range(200)]
+        last_names = [self.fake.last_name() for _ in range(200)]
+        # Одного непригодного пароля хватает всем: войти нельзя никому.
+        password = make_password(None)
+        joined = timezone.make_aware(
+            datetime.fromisoformat(options['end'])
+        ) - timedelta(days=options['days'])
+        names = (f'{options["prefix"]}{i}' for i in range(options['users']))
+        while True:
+            batch = list(itertools.islice(names, options['batch_size']))
+            if not batch:
+                break
+            User.objects.bulk_create(
+                User(
+                    username=username,
+                    first_name=self.rnd.choice(first_names),
+                    last_name=self.rnd.choice(last_names),
+                    password=password,
+                    date_joined=joined,
+                )
+                for username in batch
+            )
+            # Сигнал create_user_stats при bulk_create не срабатывает, а
+            # без UserStats профиль и страница поста не откроются.
+            UserStats.objects.bulk_create(
+                UserStats(user_id=user_id)
+                for user_id in User.objects.filter(
+                    username__in=batch
+                ).values_list('pk', flat=True)
+            )
+        user_ids = list(
+            User.objects.filter(
+                username__startswith=options['prefix']
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+        self.report('Пользователи', len(user_ids))
+        return user_ids
+
+    def generate_groups(self):
+        prefix = self.options['prefix'].replace('_', '-')
+        Group.objects.bulk_create(
+            Group(
+                slug=f'{prefix}{i}',
+                title=self.fake.catch_phrase()[:200],
+                description=self.fake.paragraph(),
+            )
+            for i in range(self.options['groups'])
+        )
+        group_ids = list(
+            Group.objects.filter(
+                slug__startswith=prefix
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+        self.report('Группы', len(group_ids))
+        return group_ids
+
+    def generate_images(self):
+        storage = Post.image.field.storage
+        names = []
+        for _ in range(self.options['images']):
+            width = self.rnd.randrange(320, 1600)
+            height = self.rnd.randrange(240, 1200)
+            image = Image.new('RGB', (width, height), tuple(
+                self.rnd.randrange(256) for _ in range(3)
+            ))
+            # Несколько прямоугольников, чтобы картинки не были одинаковыми
+            # после сжатия.
+            for _ in range(5):
+                left = self.rnd.randrange(width)
+                top = self.rnd.randrange(height)
+                image.paste(
+                    tuple(self.rnd.randrange(256) for _ in range(3)),
+                    (left, top, width, min(height, top + 40)),
+                )
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=85)
+            names.append(storage.save(
+                f'{Post.image.field.upload_to}generated.jpg',
+                ContentFile(buffer.getvalue()),
+            ))
+        # Ссылки на картинки сосчитает recount.
+        ImageBlob.objects.bulk_create(
+            (ImageBlob(name=name) for name in names), ignore_conflicts=True
+        )
+        if names:
+            self.report('Картинки', len(names))
+        return names
+
+    def generate_posts(self, user_ids, group_ids, images):
+        options = self.options
+        rnd = self.rnd
+        words = self.fake.words(nb=2000)
+        end = timezone.make_aware(datetime.fromisoformat(options['end']))
+        span = timedelta(days=options['days']) / max(options['posts'], 1)
+        start = end - span * options['posts']
+        next_post = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        next_comment = (
+            Comment.objects.aggregate(last=Max('pk'))['last'] or 0
+        ) + 1
+        posts, comments = [], []
+        created = 0
+        for number in range(options['posts']):
+            # Посты идут по времени, id растут вместе с датой.
+            pub_date = start + span * (number + rnd.random())
+            author_id = rnd.choices(
+                user_ids, cum_weights=self.popularity
+            )[0]
+            post = Post(
+                pk=next_post + number,
+                author_id=author_id,
+                group_id=(
+                    rnd.choice(group_ids)
+                    if group_ids and rnd.random() < 0.7 else None
+                ),
+                text=' '.join(rnd.choices(words, k=rnd.randint(5, 60))),
+                pub_date=pub_date,
+                image=(
+                    rnd.choice(images)
+                    if images and rnd.random() < options['image_share']
+                    else ''
+                ),
+            )
+            posts.append(post)
+            thread = []
+            for _ in range(heavy_tail(
+                rnd, options['comments'], options['alpha'], 10000
+            )):
+                parent = rnd.choice(thread) if thread else None
+                if parent and (
+                    rnd.random() < 0.5 or parent.depth >= MAX_THREAD_DEPTH
+                ):
+                    parent = None
+                comment = Comment(
+                    pk=next_comment,
+                    post_id=post.pk,
+                    parent_id=parent.pk if parent else None,
+                    author_id=rnd.choice(user_ids),
+                    text=' '.join(rnd.choices(words, k=rnd.randint(2, 20))),
+                    created=pub_date + timedelta(
+                        minutes=rnd.expovariate(1 / 600)
+                    ),
+                    path=(parent.path if parent else '') + segment(
+                        next_comment
+                    ),
+                    depth=parent.depth + 1 if parent else 0,
+                )
+                next_comment += 1
+                thread.append(comment)
+                comments.append(comment)
+            if len(posts) >= options['batch_size'] or (
+                len(comments) >= options['batch_size']
+            ):
+                created += self.flush(posts, comments)
+                posts, comments = [], []
+        created += self.flush(posts, comments)
+        self.report('Посты', options['posts'])
+        self.report('Комментарии', created)
+
+    def flush(self, posts, comments):
+        # Посты вставляются раньше: на них ссылаются комментарии.
+        Post.objects.bulk_create(posts)
+        Comment.objects.bulk_create(comments)
+        return len(comments)
+
+    def generate_follows(self, user_ids):
+        options = self.options
+        rnd = self.rnd
+        limit = len(user_ids) - 1
+        follows = []
+        created = 0
+        for user_id in user_ids:
+            wanted = max(1, heavy_tail(
+                rnd, options['follows'], options['alpha'], limit
+            ))
+            authors = set()
+            # Популярных авторов выбирают чаще, поэтому у нескольких
+            # знаменитостей оказывается большая часть подписчиков.
+            for _ in range(3):
+                authors.update(rnd.choices(
+                    user_ids, cum_weights=self.popularity, k=wanted
+                ))
+                authors.discard(user_id)
+                if len(authors) >= wanted:
+                    break
+            follows.extend(
+                Follow(user_id=user_id, author_id=author_id)
+                for author_id in sorted(authors)[:wanted]
+            )
+            if len(follows) >= options['batch_size']:
+                Follow.objects.bulk_create(follows)
+                created += len(follows)
+                follows = []
+        Follow.objects.bulk_create(follows)
+        created += len(follows)
+        self.report('Подписки', created)
+
+    def fill_timelines(self):
+        """Раскладывает ленты, как fan_out, но по автору за раз.
+
+        Запускается после reclassify_authors, чтобы посты знаменитостей
+        в ленты не попали.
+        """
+        filled = timeline.fill(
+            Follow.objects.filter(
+                user__username__startswith=self.options['prefix']
+            ),
+            chunk_size=self.options['batch_size'],
+        )
+        self.report('Строки лент', filled)
@@ -0,0 +1,96 @@
+import json
+
+from django.core.management.base import BaseCommand
+from posts.models import Post
+from posts.thumbnails import (CARD_FORMATS, CARD_WIDTHS, card_variant,
+                              ensure_thumbnails, thumbnail_file)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает объём картинок карточек на выборке постов: одна '
+        'JPEG 960 против варианта из srcset, который выберет браузер. '
+        'Недостающие миниатюры выборки создаются. Отчёт в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=100,
+            help='Сколько последних постов с картинками взять',
+        )
+        parser.add_argument(
+            '--viewport', type=int, action='append',
+            help='Ширина экрана в CSS-пикселях; можно указать несколько',
+        )
+        parser.add_argument(
+            '--dpr', type=float, default=2,
+            help='Плотность пикселей экрана',
+        )
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').order_by('-pk').values_list(
+            'image', flat=True
+        )
+        sample = [
+            sizes for sizes in map(self.measure, images[:options['limit']])
+            if sizes is not None
+        ]
+        report = {
+            'images': len(sample),
+            'dpr': options['dpr'],
+            'viewports': {},
+        }
+        for viewport in options['viewport'] or (360, 414, 768, 1280):
+            variant = self.choose(viewport, options['dpr'])
+            before = sum(sizes['JPEG', 960] for sizes in sample)
+            after = sum(sizes[variant] for sizes in sample)
+            report['viewports'][str(viewport)] = {
+                'format': variant[0],
+                'width': variant[1],
+                'before_bytes': before,
+                'after_bytes': after,
+                'saved_percent': (
+                    round(100 * (before - after) / before, 1)
+                    if before else 0
+                ),
+            }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        self.stdout.write(output)
+
+    def measure(self, image_name):
+        """Размеры в байтах всех вариантов карточки или None.
+
+        Картинка без какого-нибудь варианта в выборку не входит: сравнить
+        её не с чем.
+        """
+        if ensure_thumbnails(image_name) == 'failed':
+            return None
+        sizes = {}
+        for image_format in CARD_FORMATS:
+            for width in CARD_WIDTHS:
+                thumbnail = thumbnail_file(
+                    image_name, *card_variant(width, image_format)
+                )
+                if not thumbnail.exists():
+                    return None
+                sizes[image_format, width] = thumbnail.storage.size(
+                    thumbnail.name
+                )
+        return sizes
+
+    def choose(self, viewport, dpr):
+        """Вариант, который браузер выберет по srcset и sizes шаблона.
+
+        sizes="(max-width: 960px) 100vw, 960px": слот равен ширине
+        экрана, но не больше 960 CSS-пикселей.
+        """
+        needed = min(viewport, 960) * dpr
+        width = next(
+            (width for width in CARD_WIDTHS if width >= needed),
+            CARD_WIDTHS[-1],
+        )
+        return CARD_FORMATS[-1], width
@@ -0,0 +1,308 @@
+import json
+import time
+
+from core import page_cache
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from posts import timeline
+from posts.models import (Comment, Follow, Group, ImageBlob, Post,
+                          UserStats)
+from posts.transfer import (KINDS, load_datetime, open_stream, raw_dates,
+                            reset_sequences)
+
+User = get_user_model()
+
+
+def existing(model, records, *fields):
+    """id -> значения полей у уже существующих строк с id из пачки."""
+    return {
+        pk: values
+        for pk, *values in model.objects.filter(
+            pk__in=[record['id'] for record in records]
+        ).values_list('pk', *fields)
+    }
+
+
+def resolve(model, field, values):
+    """Словарь значение поля -> id одним запросом на пачку."""
+    return dict(
+        model.objects.filter(**{f'{field}__in': set(values)}).values_list(
+            field, 'pk'
+        )
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает JSONL, выгруженный export_jsonl, пачками через '
+        'bulk_create. Пользователи и группы сопоставляются по username и '
+        'slug. У постов и комментариев сохраняются id, чтобы остались '
+        'верны пути веток: строка с тем же id и теми же автором и датой '
+        'считается загруженной раньше и пропускается, поэтому прерванную '
+        'загрузку можно повторить, а id, занятый другой строкой, '
+        'останавливает загрузку. Сигналы не срабатывают: знаменитости, '
+        'ленты подписок, счётчики и поисковый индекс перестраиваются в '
+        'конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл выгрузки; .gz - со сжатием, "-" - stdin',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Сколько записей вставлять одним bulk_create',
+        )
+        parser.add_argument(
+            '--skip-rebuild',
+            action='store_true',
+            help='Не пересчитывать счётчики, поисковый индекс и '
+                 'знаменитостей; тогда нужно запустить recount, '
+                 'rebuild_search_index и reclassify_authors вручную',
+        )
+
+    def handle(self, *args, **options):
+        self.stats = {'loaded': 0, 'skipped': 0}
+        self.started = time.perf_counter()
+        # Подписки этой загрузки - с id больше последнего до неё.
+        last_follow = Follow.objects.aggregate(last=Max('pk'))['last'] or 0
+        try:
+            self.load(options)
+        finally:
+            # Явные id не двигают последовательности PostgreSQL. Ленты
+            # тоже раскладываются и у частично загруженного файла:
+            # повторная загрузка вставленные подписки пропустит.
+            reset_sequences(Post, Comment)
+            # Знаменитости - раньше лент, иначе их ленты разложились бы
+            # и тут же удалились.
+            if not options['skip_rebuild']:
+                call_command('reclassify_authors', stdout=self.stdout)
+            filled = timeline.fill(
+                Follow.objects.filter(pk__gt=last_follow),
+                chunk_size=options['batch_size'],
+            )
+            self.stdout.write(f'Строк лент: {filled}')
+        if not options['skip_rebuild']:
+            call_command('recount', stdout=self.stdout)
+            call_command('rebuild_search_index', stdout=self.stdout)
+
+    def load(self, options):
+        loaders = {kind: getattr(self, f'load_{kind}s') for kind in KINDS}
+        kind, batch = None, []
+        with open_stream(options['path'], 'r') as stream, raw_dates():
+            for number, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    raise CommandError(f'Строка {number}: не JSON')
+                if record.get('type') not in loaders:
+                    raise CommandError(
+                        f'Строка {number}: неизвестный тип записи'
+                    )
+                if batch and (
+                    record['type'] != kind
+                    or len(batch) == options['batch_size']
+                ):
+                    self.flush(loaders[kind], batch)
+                    batch = []
+                kind = record['type']
+                batch.append(record)
+            if batch:
+                self.flush(loaders[kind], batch)
+
+    def flush(self, loader, batch):
+        """Загружает пачку; загрузчик возвращает число вставленных строк."""
+        loaded = loader(batch)
+        self.stats['loaded'] += loaded
+        self.stats['skipped'] += len(batch) - loaded
+        self.report()
+
+    def report(self):
+        loaded = self.stats['loaded']
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(
+            f'Загружено {loaded} записей, '
+            f'пропущено: {self.stats["skipped"]}, '
+            f'{loaded / max(elapsed, 1e-9):.1f} записей/с'
+        )
+
+    def collision(self, name, pk):
+        return CommandError(
+            f'{name} id={pk} уже занят другой строкой. Загружать можно '
+            f'только в базу, где id постов и комментариев не пересекаются '
+            f'с выгрузкой; загруженное до этой пачки сохранено.'
+        )
+
+    def load_users(self, batch):
+        present = resolve(
+            User, 'username', (record['username'] for record in batch)
+        )
+        users = [
+            User(
+                username=record['username'],
+                first_name=record['first_name'],
+                last_name=record['last_name'],
+                email=record['email'],
+                is_active=record['is_active'],
+                date_joined=load_datetime(record['date_joined']),
+                # Пароли не переносятся.
+                password=make_password(None),
+            )
+            for record in batch
+            if record['username'] not in present
+        ]
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        # Без сигнала create_user_stats; recount пересчитает счётчики,
+        # но строка нужна профилю и странице поста и без него.
+        UserStats.objects.bulk_create(
+            (
+                UserStats(user_id=user_id)
+                for user_id in User.objects.filter(
+                    username__in=[user.username for user in users]
+                ).values_list('pk', flat=True)
+            ),
+            ignore_conflicts=True,
+        )
+        return len(users)
+
+    def load_groups(self, batch):
+        present = resolve(Group, 'slug', (record['slug'] for record in batch))
+        groups = [
+            Group(
+                slug=record['slug'],
+                title=record['title'],
+                description=record['description'],
+            )
+            for record in batch
+            if record['slug'] not in present
+        ]
+        Group.objects.bulk_create(groups, ignore_conflicts=True)
+        return len(groups)
+
+    def load_posts(self, batch):
+        authors = resolve(
+            User, 'username', (record['author'] for record in batch)
+        )
+        groups = resolve(
+            Group, 'slug', (record['group'] for record in batch)
+        )
+        present = existing(Post, batch, 'author_id', 'pub_date')
+        posts = []
+        for record in batch:
+            author_id = authors.get(record['author'])
+            pub_date = load_datetime(record['pub_date'])
+            if record['id'] in present:
+                if present[record['id']] != [author_id, pub_date]:
+                    raise self.collision('Пост', record['id'])
+                continue
+            if author_id is None:
+                continue
+            posts.append(Post(
+                pk=record['id'],
+                author_id=author_id,
+                group_id=groups.get(record['group']),
+                text=record['text'],
+                pub_date=pub_date,
+                image=record['image'],
+                image_width=record['image_width'],
+                image_height=record['image_height'],
+                image_placeholder=record['image_placeholder'],
+            ))
+        Post.objects.bulk_create(posts)
+        # Файлы картинок переносятся отдельно; число ссылок на них
+        # выставит recount.
+        ImageBlob.objects.bulk_create(
+            (ImageBlob(name=name) for name in {
+                str(post.image) for post in posts if post.image
+            }),
+            ignore_conflicts=True,
+        )
+        page_cache.bump(
+            'posts',
+            'groups',
+            *{f'author:{record["author"]}' for record in batch},
+            *{f'group:{record["group"]}' for record in batch
+              if record['group']},
+        )
+        return len(posts)
+
+    def load_comments(self, batch):
+        authors = resolve(
+            User, 'username', (record['author'] for record in batch)
+        )
+        present = existing(Comment, batch, 'post_id', 'author_id', 'created')
+        # Пост с id из выгрузки - тот самый: чужие id отсеяны при
+        # загрузке постов.
+        posts = set(Post.objects.filter(
+            pk__in={record['post'] for record in batch}
+        ).values_list('pk', flat=True))
+        # Родитель идёт раньше ответов: он либо уже в базе, либо выше
+        # в этой же пачке.
+        known = set(Comment.objects.filter(
+            pk__in={record['parent'] for record in batch if record['parent']}
+        ).values_list('pk', flat=True))
+        comments = []
+        for record in batch:
+            author_id = authors.get(record['author'])
+            created = load_datetime(record['created'])
+            if record['id'] in present:
+                if present[record['id']] != [
+                    record['post'], author_id, created
+                ]:
+                    raise self.collision('Комментарий', record['id'])
+                continue
+            if (
+                author_id is None
+                or record['post'] not in posts
+                or record['parent'] and record['parent'] not in known
+            ):
+                continue
+            known.add(record['id'])
+            comments.append(Comment(
+                pk=record['id'],
+                post_id=record['post'],
+                parent_id=record['parent'],
+                author_id=author_id,
+                text=record['text'],
+                created=created,
+                path=record['path'],
+                depth=record['depth'],
+            ))
+        Comment.objects.bulk_create(comments)
+        return len(comments)
+
+    def load_follows(self, batch):
+        users = resolve(
+            User,
+            'username',
+            (
+                username for record in batch
+                for username in (record['user'], record['author'])
+            ),
+        )
+        pairs = {
+            (users[record['user']], users[record['author']])
+            for record in batch
+            if record['user'] in users and record['author'] in users
+        }
+        present = set(Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).values_list('user_id', 'author_id'))
+        pairs = sorted(pairs - present)
+        Follow.objects.bulk_create(
+            (
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in pairs
+            ),
+            ignore_conflicts=True,
+        )
+        return len(pairs)
@@ -0,0 +1,58 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from posts.counters import recount_search_terms
+from posts.models import Post, SearchEntry, SearchTerm
+from posts.search import MAX_WEIGHT, terms
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит поисковый индекс по всем постам пачками по первичному '
+        'ключу. Поиск работает и во время перестройки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько постов индексировать за раз',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = Post.objects.order_by('pk').values_list('pk', 'text')
+        vocabulary = set()
+        indexed = 0
+        started = time.perf_counter()
+        batch = list(posts[:batch_size])
+        while batch:
+            entries = []
+            for pk, text in batch:
+                for term, weight in Counter(terms(text)).items():
+                    vocabulary.add(term)
+                    entries.append(SearchEntry(
+                        post_id=pk, term=term, weight=min(weight, MAX_WEIGHT)
+                    ))
+            SearchEntry.objects.filter(
+                post_id__in=[pk for pk, _ in batch]
+            ).delete()
+            SearchEntry.objects.bulk_create(entries)
+            indexed += len(batch)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'Проиндексировано {indexed} постов (до pk={batch[-1][0]}), '
+                f'{indexed / elapsed:.1f} постов/с'
+            )
+            batch = list(posts.filter(pk__gt=batch[-1][0])[:batch_size])
+        SearchTerm.objects.bulk_create(
+            (SearchTerm(term=term) for term in vocabulary),
+            ignore_conflicts=True,
+        )
+        names = list(SearchTerm.objects.values_list('term', flat=True))
+        for start in range(0, len(names), batch_size):
+            recount_search_terms(names[start:start + batch_size])
+        SearchTerm.objects.filter(posts_count=0).delete()
+        self.stdout.write(f'Постов: {indexed}, основ: {len(vocabulary)}')
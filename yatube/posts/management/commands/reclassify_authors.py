@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from posts import timeline
+from posts.models import Celebrity, Follow, Timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает знаменитостей по числу подписчиков: их посты '
+        'подмешиваются в ленты при чтении, остальные раскладываются '
+        'при записи.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=int,
+            default=settings.CELEBRITY_FOLLOWERS_THRESHOLD,
+            help='Число подписчиков, начиная с которого автор - знаменитость',
+        )
+
+    def handle(self, *args, **options):
+        counts = dict(
+            Follow.objects.values_list('author_id').annotate(
+                followers=Count('id')
+            ).filter(followers__gte=options['threshold'])
+        )
+        current = set(Celebrity.objects.values_list('author_id', flat=True))
+        promoted = set(counts) - current
+        demoted = current - set(counts)
+
+        with transaction.atomic():
+            Celebrity.objects.bulk_create(
+                Celebrity(
+                    author_id=author_id, followers_count=counts[author_id]
+                )
+                for author_id in promoted
+            )
+            Timeline.objects.filter(author_id__in=promoted).delete()
+            for author_id in set(counts) & current:
+                Celebrity.objects.filter(author_id=author_id).update(
+                    followers_count=counts[author_id]
+                )
+
+        for author_id in demoted:
+            with transaction.atomic():
+                Celebrity.objects.filter(author_id=author_id).delete()
+                followers = Follow.objects.filter(
+                    author_id=author_id
+                ).values_list('user_id', flat=True)
+                for user_id in followers.iterator():
+                    timeline.backfill(user_id, author_id)
+
+        self.stdout.write(
+            f'Знаменитостей: {len(counts)}, '
+            f'добавлено: {len(promoted)}, исключено: {len(demoted)}'
+        )
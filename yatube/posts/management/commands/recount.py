@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from posts.counters import RECOUNTERS
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики постов, комментариев, '
+        'подписок и ссылок на картинки пачками по первичному ключу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько записей пересчитывать за один UPDATE',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, recount in RECOUNTERS:
+            updated = 0
+            batch = []
+            ids = model.objects.order_by('pk').values_list('pk', flat=True)
+            for pk in ids.iterator(chunk_size=batch_size):
+                batch.append(pk)
+                if len(batch) == batch_size:
+                    updated += recount(batch)
+                    batch = []
+            if batch:
+                updated += recount(batch)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: пересчитано {updated}'
+            )
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:11
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    """Старые картинки показываются как раньше: миниатюра по запросу."""
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.exclude(image='').update(thumbnails_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails_ready',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
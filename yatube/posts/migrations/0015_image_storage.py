@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:20
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_image_refs(apps, schema_editor):
+    ImageBlob = apps.get_model('posts', 'ImageBlob')
+    Post = apps.get_model('posts', 'Post')
+    refs = (
+        Post.objects.exclude(image='')
+        .order_by()
+        .values('image')
+        .annotate(total=Count('pk'))
+        .values_list('image', 'total')
+    )
+    ImageBlob.objects.bulk_create(
+        [ImageBlob(name=name, refcount=total) for name, total in refs],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_image_placeholder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(count_image_refs, migrations.RunPython.noop),
+    ]
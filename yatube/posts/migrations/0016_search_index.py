@@ -0,0 +1,71 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:30
+
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+from posts.search import MAX_WEIGHT, terms
+
+BATCH_SIZE = 1000
+
+
+def index_posts(apps, schema_editor):
+    """Индексирует существующие посты, как rebuild_search_index."""
+    Post = apps.get_model('posts', 'Post')
+    SearchEntry = apps.get_model('posts', 'SearchEntry')
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    posts = Post.objects.order_by('pk').values_list('pk', 'text')
+    posts_count = Counter()
+    batch = list(posts[:BATCH_SIZE])
+    while batch:
+        entries = []
+        for pk, text in batch:
+            for term, weight in Counter(terms(text)).items():
+                posts_count[term] += 1
+                entries.append(SearchEntry(
+                    post_id=pk, term=term, weight=min(weight, MAX_WEIGHT)
+                ))
+        SearchEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+        batch = list(posts.filter(pk__gt=batch[-1][0])[:BATCH_SIZE])
+    SearchTerm.objects.bulk_create(
+        [
+            SearchTerm(term=term, posts_count=total)
+            for term, total in posts_count.items()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_image_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('term', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=40)),
+                ('weight', models.PositiveSmallIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_entries', to='posts.Post')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchentry',
+            index=models.Index(fields=['term', '-weight', '-post'], name='posts_searc_term_24056d_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(fields=('post', 'term'), name='unique_search_entry'),
+        ),
+        migrations.RunPython(index_posts, migrations.RunPython.noop),
+    ]
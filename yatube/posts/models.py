@@ -1,3 +1,4 @@
+from core.storage import ContentAddressedStorage
 from django.contrib.auth import get_user_model
 from django.db import models
 
@@ -8,6 +9,7 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
@@ -39,8 +41,17 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+    thumbnails_ready = models.BooleanField(default=False, editable=False)
+    # Когда миниатюры поставлены в очередь: по этому времени любой
+    # процесс видит, что задача застряла.
+    thumbnails_queued = models.DateTimeField(null=True, editable=False)
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_placeholder = models.TextField(blank=True, editable=False)
 
     def __str__(self):
         return self.text[:15]
@@ -49,6 +60,11 @@ class Post(models.Model):
         ordering = ('-pub_date', )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id']),
+            models.Index(fields=['author', '-pub_date', '-id']),
+            models.Index(fields=['group', '-pub_date', '-id']),
+        ]
 
 
 class Comment(models.Model):
@@ -64,6 +80,24 @@ class Comment(models.Model):
     )
     text = models.TextField()
     created = models.DateTimeField('date published', auto_now_add=True)
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='replies',
+        blank=True,
+        null=True
+    )
+    # Материализованный путь: id предков и самого комментария
+    # фиксированной ширины, так что сортировка по пути - порядок дерева.
+    path = models.TextField(default='', editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
+    replies_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        ordering = ('created', )
+        indexes = [
+            models.Index(fields=['post', 'path']),
+        ]
 
     def __str__(self):
         return self.text
@@ -80,3 +114,113 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            ),
+        ]
+
+
+class Timeline(models.Model):
+    """Материализованная лента подписок: строка на пост и подписчика."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-pub_date', )
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post']),
+            models.Index(fields=['user', 'author']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_post'
+            ),
+        ]
+
+
+class Celebrity(models.Model):
+    """Автор, чьи посты подмешиваются в ленты при чтении, а не при записи."""
+
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='celebrity'
+    )
+    followers_count = models.PositiveIntegerField(default=0)
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+
+class ImageBlob(models.Model):
+    """Файл картинки в хранилище и число постов, которые на него ссылаются.
+
+    Одинаковые картинки хранятся одним файлом, поэтому удалять файл
+    можно только когда на него не осталось ссылок.
+    """
+
+    name = models.CharField(max_length=255, primary_key=True)
+    refcount = models.PositiveIntegerField(default=0)
+
+
+class SearchTerm(models.Model):
+    """Основа слова из поискового индекса и число постов с ней."""
+
+    term = models.CharField(max_length=40, primary_key=True)
+    posts_count = models.PositiveIntegerField(default=0)
+
+
+class SearchEntry(models.Model):
+    """Вхождение основы слова в пост: строка инвертированного индекса.
+
+    ``weight`` - сколько раз основа встречается в тексте поста. Индекс
+    (term, -weight, -post) отдаёт лучшие посты по слову без сортировки.
+    """
+
+    term = models.CharField(max_length=40)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_entries'
+    )
+    weight = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', '-weight', '-post']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'term'], name='unique_search_entry'
+            ),
+        ]
@@ -0,0 +1,163 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+from core.pagination import CursorPaginator
+from core.stemmer import stem
+from django.conf import settings
+from django.db.models import F, Max
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import Post, SearchEntry, SearchTerm
+
+WORD = re.compile(r'\w+')
+STOP_WORDS = frozenset({
+    'а', 'без', 'бы', 'в', 'во', 'вот', 'да', 'для', 'до', 'его', 'ее',
+    'же', 'за', 'и', 'из', 'или', 'их', 'к', 'как', 'ко', 'ли', 'мы', 'на',
+    'над', 'не', 'нет', 'ни', 'но', 'о', 'об', 'он', 'она', 'они', 'оно',
+    'от', 'по', 'под', 'при', 'с', 'со', 'так', 'там', 'то', 'тот', 'ты',
+    'у', 'уже', 'что', 'это', 'я',
+})
+TERM_LENGTH = SearchTerm._meta.get_field('term').max_length
+MAX_WEIGHT = 32767
+# Насыщение частоты слова в тексте, как в BM25.
+TF_SATURATION = 1.2
+# Совпадение по всем словам запроса важнее любого веса.
+MATCH_SCALE = 10 ** 9
+
+
+def terms(text):
+    """Основы значимых слов текста."""
+    for word in WORD.findall(text.lower().replace('ё', 'е')):
+        if word in STOP_WORDS or len(word) < 2 and not word.isdigit():
+            continue
+        yield stem(word)[:TERM_LENGTH]
+
+
+def _change_terms(names, delta):
+    if not names:
+        return
+    queryset = SearchTerm.objects.filter(term__in=names)
+    if delta > 0:
+        SearchTerm.objects.bulk_create(
+            [SearchTerm(term=name) for name in names], ignore_conflicts=True
+        )
+    else:
+        queryset = queryset.filter(posts_count__gte=-delta)
+    queryset.update(posts_count=F('posts_count') + delta)
+
+
+def index_post(post):
+    """Переписывает вхождения поста и число постов у его основ."""
+    weights = Counter(terms(post.text))
+    previous = set(
+        SearchEntry.objects.filter(post=post).values_list('term', flat=True)
+    )
+    SearchEntry.objects.filter(post=post).delete()
+    SearchEntry.objects.bulk_create(
+        SearchEntry(post=post, term=term, weight=min(weight, MAX_WEIGHT))
+        for term, weight in weights.items()
+    )
+    _change_terms(list(weights.keys() - previous), 1)
+    _change_terms(list(previous - weights.keys()), -1)
+
+
+def unindex_post(post_id):
+    """Уменьшает число постов у основ удаляемого поста."""
+    _change_terms(
+        list(SearchEntry.objects.filter(post_id=post_id).values_list(
+            'term', flat=True
+        )),
+        -1,
+    )
+
+
+def rank(query):
+    """Пары (ранг, id поста) по убыванию релевантности.
+
+    Для каждой основы запроса читается не больше SEARCH_CANDIDATES
+    лучших вхождений по индексу, поэтому цена запроса не растёт вместе
+    с числом постов. Вес вхождения - насыщенная частота слова,
+    умноженная на IDF основы, как в BM25; посты со всеми словами
+    запроса идут раньше остальных.
+    """
+    query_terms = list(dict.fromkeys(terms(query)))[
+        :settings.SEARCH_MAX_TERMS
+    ]
+    if not query_terms:
+        return []
+    frequencies = dict(
+        SearchTerm.objects.filter(
+            term__in=query_terms, posts_count__gt=0
+        ).values_list('term', 'posts_count')
+    )
+    if not frequencies:
+        return []
+    # Наибольший id - оценка числа постов по индексу, без COUNT(*).
+    total = Post.objects.aggregate(total=Max('pk'))['total'] or 0
+    scores = defaultdict(float)
+    matches = Counter()
+    for term, posts_count in frequencies.items():
+        idf = math.log(1 + (total - posts_count + 0.5) / (posts_count + 0.5))
+        entries = SearchEntry.objects.filter(term=term).order_by(
+            '-weight', '-post_id'
+        ).values_list('post_id', 'weight')
+        for post_id, weight in entries[:settings.SEARCH_CANDIDATES]:
+            tf = weight * (TF_SATURATION + 1) / (weight + TF_SATURATION)
+            scores[post_id] += tf * max(idf, 0.01)
+            matches[post_id] += 1
+    return sorted(
+        (
+            (matches[post_id] * MATCH_SCALE + round(score * 1000), post_id)
+            for post_id, score in scores.items()
+        ),
+        reverse=True,
+    )
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсорная пагинация по рангу результатов поиска.
+
+    Курсор - пара (ранг, id поста); ранжированный список пересчитывается
+    на каждой странице, но его длина ограничена.
+    """
+
+    def __init__(self, query, per_page):
+        super().__init__(Post.objects.none(), per_page)
+        self.query = query
+
+    @cached_property
+    def ranking(self):
+        return rank(self.query)
+
+    def encode_cursor(self, key):
+        score, pk = key
+        return urlsafe_base64_encode(force_bytes(f'{score}|{pk}'))
+
+    def decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            score, pk = force_str(urlsafe_base64_decode(token)).split('|')
+            return int(score), int(pk)
+        except ValueError:
+            return None
+
+    def _fetch(self, cursor, newer, limit):
+        if newer:
+            keys = [key for key in reversed(self.ranking) if key > cursor]
+        else:
+            keys = [
+                key for key in self.ranking
+                if cursor is None or key < cursor
+            ]
+        keys = keys[:limit]
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for _, pk in keys]
+        )
+        return [(key, posts[key[1]]) for key in keys if key[1] in posts]
+
+    def get_legacy_cursor(self, number):
+        return None
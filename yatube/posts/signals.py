@@ -0,0 +1,234 @@
+from core import page_cache
+from django.core.signals import setting_changed
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, search, threads, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+USER_PAGE_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+def bump_post_pages(post_id, group_ids=()):
+    """Сбрасывает страницу поста и ленты, в которых он показан.
+
+    Главная сбрасывается всегда, страницы группы и автора - только
+    свои, а не все группы и профили сразу.
+    """
+    post = Post.objects.filter(pk=post_id).values(
+        'author__username', 'group_id'
+    ).first()
+    if post is None:
+        return
+    scopes = [
+        'posts', f'post:{post_id}', f'author:{post["author__username"]}'
+    ]
+    group_ids = {post['group_id'], *group_ids} - {None}
+    if group_ids:
+        slugs = Group.objects.filter(pk__in=group_ids).values_list(
+            'slug', flat=True
+        )
+        scopes.extend(f'group:{slug}' for slug in slugs)
+    page_cache.bump(*scopes)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    """Убирает посты автора из ленты после отписки."""
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, **kwargs):
+    """Запоминает прежние группу, картинку и текст поста.
+
+    Группа нужна, чтобы поправить её счётчик, текст - чтобы не
+    переиндексировать пост без нужды; после замены картинки миниатюры,
+    размеры и заглушку надо делать заново.
+    """
+    if instance.pk is None:
+        return
+    previous = Post.objects.filter(pk=instance.pk).values(
+        'group_id', 'image', 'text'
+    ).first()
+    if previous is None:
+        return
+    instance._previous_group_id = previous['group_id']
+    instance._previous_image = previous['image']
+    instance._previous_text = previous['text']
+    if previous['image'] != instance.image.name:
+        instance.thumbnails_ready = False
+        instance.image_width = instance.image_height = None
+        instance.image_placeholder = ''
+
+
+@receiver(pre_save, sender=Post)
+def stamp_thumbnails_queue(sender, instance, **kwargs):
+    """Время постановки в очередь сохраняется вместе с постом."""
+    if instance.image and not instance.thumbnails_ready:
+        instance.thumbnails_queued = timezone.now()
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, **kwargs):
+    """Миниатюры делаются в фоне, а не при первом показе поста."""
+    if instance.image and not instance.thumbnails_ready:
+        thumbnails.schedule(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_counter(instance.author_id, 'posts_count', 1)
+        counters.change_group_counter(instance.group_id, 1)
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        counters.change_group_counter(previous_group_id, -1)
+        counters.change_group_counter(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'posts_count', -1)
+    counters.change_group_counter(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_image(sender, instance, created, **kwargs):
+    """Один файл может принадлежать нескольким постам."""
+    previous_image = getattr(instance, '_previous_image', None)
+    if created or previous_image != instance.image.name:
+        counters.change_image_refcount(instance.image.name, 1)
+        counters.change_image_refcount(previous_image, -1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_image(sender, instance, **kwargs):
+    counters.change_image_refcount(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, created, **kwargs):
+    if created or getattr(instance, '_previous_text', None) != instance.text:
+        search.index_post(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    """Вхождения удалит каскад, а число постов у основ - только мы."""
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        threads.place(instance)
+        threads.change_replies_count(instance, 1)
+        counters.change_post_counter(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    """Каскад удаляет и ответы; каждый вычитается у своих предков."""
+    threads.change_replies_count(instance, -1)
+    counters.change_post_counter(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_counter(instance.author_id, 'followers_count', 1)
+        counters.change_user_counter(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'followers_count', -1)
+    counters.change_user_counter(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, **kwargs):
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    bump_post_pages(instance.pk, [previous_group_id])
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    scopes = ['posts', f'author:{instance.author.username}']
+    if instance.group_id is not None:
+        slug = Group.objects.filter(pk=instance.group_id).values_list(
+            'slug', flat=True
+        ).first()
+        if slug is not None:
+            scopes.append(f'group:{slug}')
+    page_cache.bump(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_post(sender, instance, **kwargs):
+    """Счётчик комментариев виден в карточке поста во всех лентах."""
+    bump_post_pages(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_followed_profile(sender, instance, **kwargs):
+    """В профиле автора видно число подписчиков и кнопку подписки,
+    в профиле подписчика - число его подписок.
+
+    Области по id, чтобы каскадное удаление подписок не читало
+    пользователей на каждую строку.
+    """
+    page_cache.bump(
+        f'follows:{instance.author_id}', f'follows:{instance.user_id}'
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    """Название и адрес группы выводятся в карточках всех лент."""
+    page_cache.bump('posts', 'groups')
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_pages(sender, instance, created, update_fields,
+                          **kwargs):
+    """Имя автора выводится в карточках; вход в систему не в счёт."""
+    if created:
+        return
+    if update_fields is not None and not USER_PAGE_FIELDS & update_fields:
+        return
+    page_cache.bump('posts', 'groups', f'author:{instance.username}')
+
+
+@receiver(setting_changed)
+def drain_thumbnails(sender, setting, **kwargs):
+    """Миниатюры старого MEDIA_ROOT дописываются до его подмены."""
+    if setting == 'MEDIA_ROOT':
+        thumbnails.drain()
@@ -0,0 +1,14 @@
+from django import template
+
+from ..models import Follow
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def following(context, author_id):
+    """Подписан ли текущий пользователь на автора."""
+    user = context['user']
+    if not user.is_authenticated:
+        return False
+    return Follow.objects.filter(user=user, author_id=author_id).exists()
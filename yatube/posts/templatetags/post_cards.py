@@ -0,0 +1,56 @@
+from hashlib import md5
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from ..thumbnails import attach_thumbnails
+
+register = template.Library()
+
+
+def card_key(post, show_group_link):
+    """Ключ карточки: id поста и отпечаток всего, что в ней выводится.
+
+    Правка поста, смена группы или имени автора меняют отпечаток, так
+    что устаревшая карточка просто перестаёт читаться.
+    """
+    state = (
+        post.text,
+        post.image.name,
+        post.thumbnails_ready,
+        post.image_placeholder,
+        post.pub_date.isoformat(),
+        post.comments_count,
+        post.author.username,
+        post.author.get_full_name(),
+        post.group.slug if post.group else None,
+        show_group_link,
+    )
+    version = md5(repr(state).encode()).hexdigest()
+    return f'post-card:{post.pk}:{version}'
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """HTML карточек постов страницы, прочитанный из кэша одним get_many.
+
+    Миниатюры для недостающих карточек тоже читаются одной пачкой.
+    """
+    show_group_link = not context.get('group')
+    cards = {card_key(post, show_group_link): post for post in posts}
+    cached = cache.get_many(cards)
+    misses = {key: post for key, post in cards.items() if key not in cached}
+    attach_thumbnails(misses.values())
+    rendered = {}
+    for key, post in misses.items():
+        rendered[key] = render_to_string(
+            'includes/card_post.html',
+            {'post': post, 'show_group_link': show_group_link},
+        )
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+    cached.update(rendered)
+    return [mark_safe(cached[key]) for key in cards]
@@ -0,0 +1,79 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Group, Post, SearchEntry, SearchTerm
+
+User = get_user_model()
+
+
+class PostAdminTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.groups = [
+            Group.objects.create(title=f'Группа {i}', slug=f'group_{i}')
+            for i in range(3)
+        ]
+        Post.objects.bulk_create([
+            Post(
+                author=cls.admin,
+                group=cls.groups[i % len(cls.groups)],
+                text=f'Запись номер {i}',
+            )
+            for i in range(30)
+        ])
+        cls.cat = Post.objects.create(author=cls.admin, text='Котики спят')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def changelist(self, **params):
+        return self.client.get(
+            reverse('admin:posts_post_changelist'), params
+        )
+
+    def test_changelist_queries_do_not_grow(self):
+        """Список постов не делает запросов на каждую строку"""
+        self.changelist()
+        with self.assertNumQueries(6):
+            response = self.changelist()
+        self.assertEqual(len(response.context['cl'].result_list), 31)
+        Post.objects.bulk_create([
+            Post(author=self.admin, group=self.groups[0], text='Ещё')
+            for _ in range(30)
+        ])
+        with self.assertNumQueries(6):
+            self.changelist()
+
+    def test_search_uses_index(self):
+        """Поиск в админке находит другие формы слова"""
+        response = self.changelist(q='котиков')
+        self.assertEqual(list(response.context['cl'].result_list), [self.cat])
+
+    @override_settings(SEARCH_CANDIDATES=1)
+    def test_search_finds_every_match(self):
+        """Поиск в админке не ограничен лучшими кандидатами"""
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.changelist(q='номер')
+        self.assertEqual(len(response.context['cl'].result_list), 30)
+
+    def test_search_without_index(self):
+        """Пока индекс не построен, поиск идёт по тексту"""
+        SearchEntry.objects.all().delete()
+        SearchTerm.objects.all().delete()
+        response = self.changelist(q='Котики')
+        self.assertEqual(list(response.context['cl'].result_list), [self.cat])
+
+    def test_autocomplete_widgets(self):
+        """Автор и группа выбираются автодополнением, а не списком"""
+        response = self.client.get(
+            reverse('admin:posts_post_change', args=[self.cat.pk])
+        )
+        self.assertContains(response, 'data-ajax--url', count=2)
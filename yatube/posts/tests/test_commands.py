@@ -0,0 +1,414 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from posts.models import (Celebrity, Comment, Follow, Group, ImageBlob, Post,
+                          SearchEntry, Timeline, UserStats)
+from posts.thumbnails import ensure_thumbnails, image_files
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class ReclassifyAuthorsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.followers = [
+            User.objects.create_user(username=f'follower_{i}')
+            for i in range(3)
+        ]
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for follower in cls.followers:
+            Follow.objects.create(user=follower, author=cls.author)
+
+    def test_promote_author(self):
+        """Автор с большим числом подписчиков становится знаменитостью"""
+        call_command('reclassify_authors', threshold=3, stdout=StringIO())
+        celebrity = Celebrity.objects.get(author=self.author)
+        self.assertEqual(celebrity.followers_count, 3)
+        self.assertFalse(Timeline.objects.filter(author=self.author).exists())
+
+    def test_demote_author(self):
+        """Бывшая знаменитость снова раскладывается по лентам"""
+        call_command('reclassify_authors', threshold=3, stdout=StringIO())
+        call_command('reclassify_authors', threshold=4, stdout=StringIO())
+        self.assertFalse(Celebrity.objects.exists())
+        self.assertEqual(
+            Timeline.objects.filter(post=self.post).count(), 3
+        )
+
+
+class RecountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.bulk_create([
+            Post(author=cls.author, group=cls.group, text=f'Пост {i}')
+            for i in range(3)
+        ])
+
+    def test_recount_repairs_drift(self):
+        """recount чинит счётчики, разошедшиеся с данными"""
+        call_command('recount', batch_size=2, stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 3
+        )
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 3)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackfillThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        for i in range(3):
+            Post.objects.create(
+                author=cls.author,
+                text=f'Пост {i}',
+                image=SimpleUploadedFile(
+                    f'small_{i}.gif', SMALL_GIF, content_type='image/gif'
+                ),
+            )
+        Post.objects.create(author=cls.author, text='Без картинки')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def backfill(self):
+        out = StringIO()
+        call_command(
+            'backfill_thumbnails', processes=1, batch_size=2, stdout=out
+        )
+        return out.getvalue()
+
+    def test_backfill_generates_missing(self):
+        """backfill_thumbnails создаёт миниатюры и отмечает посты"""
+        output = self.backfill()
+        # Три одинаковые картинки - один файл и одни миниатюры.
+        self.assertIn('Картинок: 3, создано: 1, пропущено: 2', output)
+        self.assertIn('картинок/с', output)
+        self.assertFalse(
+            Post.objects.exclude(image='').filter(
+                thumbnails_ready=False
+            ).exists()
+        )
+        self.assertFalse(
+            Post.objects.exclude(image='').filter(
+                image_placeholder=''
+            ).exists()
+        )
+
+    def test_backfill_resumes(self):
+        """Повторный запуск пропускает готовые миниатюры"""
+        self.backfill()
+        output = self.backfill()
+        self.assertIn('создано: 0, пропущено: 3', output)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CollectMediaGarbageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.kept = Post.objects.create(
+            author=self.author,
+            text='Остаётся',
+            image=SimpleUploadedFile('kept.gif', SMALL_GIF, 'image/gif'),
+        )
+        orphan = Post.objects.create(
+            author=self.author,
+            text='Будет удалён',
+            image=SimpleUploadedFile(
+                'orphan.gif', SMALL_GIF + b'\x00', 'image/gif'
+            ),
+        )
+        self.orphan = orphan.image.name
+        ensure_thumbnails(self.orphan)
+        self.orphan_files = image_files(self.orphan)
+        orphan.delete()
+
+    def collect(self, **options):
+        out = StringIO()
+        options.setdefault('min_age', 0)
+        call_command(
+            'collect_media_garbage', batch_size=1, stdout=out, **options
+        )
+        return out.getvalue()
+
+    def test_dry_run_keeps_files(self):
+        """Пробный запуск только считает освобождаемое место"""
+        output = self.collect(dry_run=True)
+        self.assertIn('Пробный запуск. Файлов: 2, без ссылок: 1', output)
+        freed = sum(
+            file.storage.size(file.name) for file in self.orphan_files
+        )
+        self.assertIn(f'освобождено: {freed} байт', output)
+        self.assertTrue(default_storage.exists(self.orphan))
+
+    def test_deletes_orphans_with_thumbnails(self):
+        """Удаляются картинки без ссылок и их миниатюры"""
+        self.assertGreater(len(self.orphan_files), 1)
+        output = self.collect()
+        self.assertIn('Файлов: 2, без ссылок: 1', output)
+        for file in self.orphan_files:
+            self.assertFalse(file.exists())
+        self.assertFalse(ImageBlob.objects.filter(name=self.orphan).exists())
+        self.assertTrue(default_storage.exists(self.kept.image.name))
+
+    def test_drifted_refcount_kept(self):
+        """Файл с обнулённым счётчиком, но живым постом не удаляется"""
+        ImageBlob.objects.filter(name=self.kept.image.name).update(refcount=0)
+        output = self.collect()
+        self.assertIn('без ссылок: 1', output)
+        self.assertTrue(default_storage.exists(self.kept.image.name))
+
+    def test_recent_files_kept(self):
+        """Свежие файлы не удаляются: их пост может быть ещё не сохранён"""
+        output = self.collect(min_age=60)
+        self.assertIn('без ссылок: 0', output)
+        self.assertTrue(default_storage.exists(self.orphan))
+
+    def test_resume_after(self):
+        """--after пропускает уже проверенные файлы"""
+        last = max(self.orphan, self.kept.image.name)
+        output = self.collect(after=last)
+        self.assertIn('Файлов: 0', output)
+
+
+class TransferJsonlTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост про котов'
+        )
+        Post.objects.create(author=cls.reader, text='Без группы')
+        comment = Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.author, parent=comment, text='Ответ'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'dump.jsonl.gz')
+
+    def export(self):
+        call_command(
+            'export_jsonl', self.path, batch_size=2, stderr=StringIO()
+        )
+
+    def load(self):
+        out = StringIO()
+        call_command('import_jsonl', self.path, batch_size=2, stdout=out)
+        return out.getvalue()
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка в пустую базу восстанавливают данные"""
+        posts = list(Post.objects.order_by('pk').values_list(
+            'pk', 'author__username', 'group__slug', 'text', 'pub_date'
+        ))
+        comments = list(Comment.objects.order_by('pk').values_list(
+            'pk', 'parent_id', 'path', 'depth', 'created'
+        ))
+        self.export()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        output = self.load()
+        self.assertIn('Загружено 8 записей, пропущено: 0', output)
+        self.assertIn('записей/с', output)
+        self.assertEqual(list(Post.objects.order_by('pk').values_list(
+            'pk', 'author__username', 'group__slug', 'text', 'pub_date'
+        )), posts)
+        self.assertEqual(list(Comment.objects.order_by('pk').values_list(
+            'pk', 'parent_id', 'path', 'depth', 'created'
+        )), comments)
+        reader = User.objects.get(username='reader')
+        self.assertFalse(reader.has_usable_password())
+        self.assertTrue(Follow.objects.filter(
+            user=reader, author__username='author'
+        ).exists())
+        # Производные данные восстановлены без сигналов.
+        self.assertTrue(Timeline.objects.filter(
+            user=reader, post_id=self.post.pk
+        ).exists())
+        self.assertEqual(Group.objects.get().posts_count, 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comments_count, 2)
+        self.assertTrue(SearchEntry.objects.filter(
+            post_id=self.post.pk
+        ).exists())
+
+    def test_pages_open_without_rebuild(self):
+        """Профиль и пост загруженного автора открываются и без recount"""
+        self.export()
+        User.objects.all().delete()
+        call_command(
+            'import_jsonl', self.path, skip_rebuild=True, stdout=StringIO()
+        )
+        for url in ('/profile/author/', f'/posts/{self.post.pk}/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    @override_settings(CELEBRITY_FOLLOWERS_THRESHOLD=1)
+    def test_celebrity_timelines_not_filled(self):
+        """Посты будущих знаменитостей в ленты не раскладываются"""
+        self.export()
+        User.objects.all().delete()
+        self.load()
+        self.assertTrue(Celebrity.objects.filter(
+            author__username='author'
+        ).exists())
+        self.assertFalse(Timeline.objects.exists())
+
+    def test_repeat_import_skips_existing(self):
+        """Повторная загрузка не дублирует строки"""
+        self.export()
+        output = self.load()
+        self.assertIn('Загружено 0 записей, пропущено: 8', output)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_id_collision_stops_import(self):
+        """Чужой пост с тем же id останавливает загрузку"""
+        self.export()
+        User.objects.all().delete()
+        local = Post.objects.create(
+            pk=self.post.pk,
+            author=User.objects.create_user(username='local'),
+            text='Местный пост',
+        )
+        with self.assertRaises(CommandError):
+            self.load()
+        local.refresh_from_db()
+        self.assertEqual(local.text, 'Местный пост')
+        self.assertFalse(local.comments.exists())
+
+
+class GenerateDatasetTest(TestCase):
+    def generate(self, **options):
+        params = dict(
+            users=30, groups=3, posts=60, comments=2, follows=4,
+            celebrity_threshold=8, seed=1, skip_rebuild=True,
+        )
+        params.update(options)
+        call_command('generate_dataset', stdout=StringIO(), **params)
+
+    def dataset(self, prefix):
+        posts = Post.objects.filter(
+            author__username__startswith=prefix
+        ).order_by('pk')
+        return (
+            [
+                (author[len(prefix):], text, pub_date)
+                for author, text, pub_date in posts.values_list(
+                    'author__username', 'text', 'pub_date'
+                )
+            ],
+            Comment.objects.filter(post__in=posts).count(),
+            Follow.objects.filter(user__username__startswith=prefix).count(),
+        )
+
+    def test_generates_skewed_dataset(self):
+        """Генератор создаёт связанный набор с популярными авторами"""
+        self.generate()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertFalse(
+            Follow.objects.filter(user=F('author')).exists()
+        )
+        celebrities = Celebrity.objects.values('author')
+        self.assertTrue(celebrities.exists())
+        self.assertFalse(
+            Timeline.objects.filter(author__in=celebrities).exists()
+        )
+        self.assertTrue(Timeline.objects.exists())
+        for comment in Comment.objects.exclude(parent=None):
+            self.assertTrue(comment.path.startswith(comment.parent.path))
+
+    def test_pages_open_without_rebuild(self):
+        """Профиль и пост открываются и без recount"""
+        self.generate()
+        post = Post.objects.first()
+        for url in (
+            f'/profile/{post.author.username}/',
+            f'/posts/{post.pk}/',
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_same_seed_same_data(self):
+        """Одно и то же зерно даёт одни и те же данные"""
+        self.generate(prefix='first_')
+        self.generate(prefix='second_')
+        self.assertEqual(self.dataset('first_'), self.dataset('second_'))
+
+    def test_existing_prefix_rejected(self):
+        """Повторный запуск с тем же префиксом отклоняется"""
+        self.generate()
+        with self.assertRaises(CommandError):
+            self.generate()
+
+
+class BenchmarkTest(TransactionTestCase):
+    def test_benchmark_report(self):
+        """benchmark наполняет базу и печатает отчёт по всем сценариям"""
+        out = StringIO()
+        call_command(
+            'benchmark', current_db=True, users=3, groups=2, posts=5,
+            comments=5, follows=2, requests=3, concurrency=1, stdout=out,
+        )
+        report = json.loads(out.getvalue())
+        self.assertGreaterEqual(Post.objects.count(), 5)
+        self.assertEqual(len(report['scenarios']), 7)
+        for scenario, stats in report['scenarios'].items():
+            with self.subTest(scenario=scenario):
+                self.assertEqual(stats['requests'], 3)
+                self.assertEqual(stats['errors'], 0)
+                self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
@@ -1,12 +1,16 @@
+import hashlib
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
+from core.storage import content_name
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 from posts.models import Comment, Group, Post
 
 User = get_user_model()
@@ -47,6 +51,9 @@ class PostCreateFormTest(TestCase):
             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
             b'\x0A\x00\x3B'
         )
+        self.small_gif_name = content_name(
+            'posts', hashlib.sha256(self.small_gif).hexdigest(), '.gif'
+        )
 
     def test_post(self):
         """ Проверка валидного поста"""
@@ -77,10 +84,82 @@ class PostCreateFormTest(TestCase):
         self.assertTrue(
             Post.objects.filter(
                 text='Данные из формы',
-                image='posts/small.gif'
+                image=self.small_gif_name
             ).exists()
         )
 
+    def upload_photo(self, size, **save_options):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', **save_options)
+        uploaded = SimpleUploadedFile(
+            'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+        )
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': uploaded},
+        )
+
+    @override_settings(IMAGE_MAX_SIDE=100)
+    def test_large_image_downscaled(self):
+        """Большая картинка уменьшается, EXIF удаляется"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        self.upload_photo((400, 200), exif=exif.tobytes())
+        post = Post.objects.get(text='Фото')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertEqual(len(image.getexif()), 0)
+            self.assertNotIn('exif', image.info)
+
+    def test_small_clean_image_kept(self):
+        """Чистая картинка в пределах бюджета сохраняется как есть"""
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20), 'red').save(buffer, 'JPEG')
+        self.upload_photo((40, 20))
+        post = Post.objects.get(text='Фото')
+        self.assertEqual(
+            post.image.name,
+            content_name(
+                'posts', hashlib.sha256(buffer.getvalue()).hexdigest(), '.jpg'
+            ),
+        )
+
+    @override_settings(IMAGE_STORED_MAX_SIZE=20 * 2 ** 10)
+    def test_heavy_image_fits_budget(self):
+        """Тяжёлая картинка ужимается до бюджета, а не отклоняется"""
+        buffer = BytesIO()
+        noise = Image.effect_noise((600, 600), 100).convert('RGB')
+        noise.save(buffer, 'JPEG', quality=100)
+        self.assertGreater(buffer.tell(), 20 * 2 ** 10)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Фото',
+                'image': SimpleUploadedFile(
+                    'noise.jpg', buffer.getvalue(), content_type='image/jpeg'
+                ),
+            },
+        )
+        post = Post.objects.get(text='Фото')
+        self.assertLessEqual(post.image.size, 20 * 2 ** 10)
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_rejected(self):
+        """Картинка больше бюджета пикселей отклоняется"""
+        response = self.upload_photo((100, 100))
+        self.assertFalse(Post.objects.filter(text='Фото').exists())
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 0 мегапикселей.'
+        )
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=100)
+    def test_too_large_file_rejected(self):
+        """Слишком большой файл отклоняется"""
+        response = self.upload_photo((100, 100))
+        self.assertFalse(Post.objects.filter(text='Фото').exists())
+        self.assertFormError(response, 'form', 'image', 'Файл больше 0 МБ.')
+
     def test_guest_new_post(self):
         """
         Проверка что неавторизоанный пользователь не может создавать посты
@@ -135,7 +214,7 @@ class PostCreateFormTest(TestCase):
         self.assertTrue(
             Post.objects.filter(
                 text='Измененный текст',
-                image='posts/small1.gif'
+                image=self.small_gif_name
             ).exists()
         )
 
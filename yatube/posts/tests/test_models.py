@@ -1,7 +1,15 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, ImageBlob, Post
 
 User = get_user_model()
 
@@ -58,3 +66,132 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_slug',
+            description='Тестовое описание',
+        )
+
+    def refresh(self, *objects):
+        for obj in objects:
+            obj.refresh_from_db()
+
+    def test_post_counters(self):
+        """Счётчики постов автора и группы следуют за постами."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group
+        )
+        self.refresh(self.user.stats, self.group, self.other_group)
+        self.assertEqual(self.user.stats.posts_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.other_group
+        post.save()
+        self.refresh(self.group, self.other_group)
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+        post.delete()
+        self.refresh(self.user.stats, self.other_group)
+        self.assertEqual(self.user.stats.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_comment_counter(self):
+        """Счётчик комментариев поста следует за комментариями."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        """Счётчики подписчиков и подписок следуют за подписками."""
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.refresh(self.user.stats, self.reader.stats)
+        self.assertEqual(self.user.stats.followers_count, 1)
+        self.assertEqual(self.reader.stats.following_count, 1)
+        Follow.objects.filter(user=self.reader).delete()
+        self.refresh(self.user.stats, self.reader.stats)
+        self.assertEqual(self.user.stats.followers_count, 0)
+        self.assertEqual(self.reader.stats.following_count, 0)
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, filename, content=SMALL_GIF):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост',
+            image=SimpleUploadedFile(filename, content, 'image/gif'),
+        )
+
+    def refcount(self, name):
+        return ImageBlob.objects.get(name=name).refcount
+
+    def test_same_content_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом."""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/\w\w/\w\w/\w{64}\.gif$')
+        self.assertTrue(default_storage.exists(first.image.name))
+        directory = default_storage.path(first.image.name).rsplit('/', 1)[0]
+        self.assertEqual(len(default_storage.listdir(directory)[1]), 1)
+        self.assertEqual(self.refcount(first.image.name), 2)
+
+    def test_refcount_follows_posts(self):
+        """Число ссылок на файл следует за постами."""
+        post = self.create_post('small.gif')
+        name = post.image.name
+        other = self.create_post('other.gif', SMALL_GIF + b'\x00')
+        self.assertNotEqual(other.image.name, name)
+        post.image = other.image.name
+        post.save()
+        self.assertEqual(self.refcount(name), 0)
+        self.assertEqual(self.refcount(other.image.name), 2)
+        other.delete()
+        self.assertEqual(self.refcount(other.image.name), 1)
+
+    def test_recount_images(self):
+        """recount чинит разошедшееся число ссылок."""
+        post = self.create_post('small.gif')
+        ImageBlob.objects.filter(name=post.image.name).update(refcount=5)
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(self.refcount(post.image.name), 1)
@@ -0,0 +1,96 @@
+from io import StringIO
+
+from core.stemmer import stem
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import urlencode
+from posts.models import Post, SearchEntry, SearchTerm
+
+User = get_user_model()
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_stem(self):
+        """Формы одного слова сводятся к одной основе"""
+        cases = {
+            'котики': 'котик',
+            'котиков': 'котик',
+            'программированию': 'программирован',
+            'важнейшими': 'важн',
+            'весёлость': 'весел',
+            'валялся': 'валя',
+        }
+        for word, expected in cases.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def create_post(self, text):
+        return Post.objects.create(author=self.author, text=text)
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response, [post.pk for post in response.context['page_obj']]
+
+    def test_search_uses_stems(self):
+        """Поиск находит другие формы слова и не находит лишнего"""
+        cats = self.create_post('Мои котики спят')
+        self.create_post('Собаки гуляют')
+        _, found = self.search('котиков')
+        self.assertEqual(found, [cats.pk])
+
+    def test_ranking(self):
+        """Посты со всеми словами и чаще упоминающие слово идут раньше"""
+        once = self.create_post('Котик на окне')
+        twice = self.create_post('Котик и ещё котик')
+        both = self.create_post('Котик и собака')
+        _, found = self.search('котик собака')
+        self.assertEqual(found, [both.pk, twice.pk, once.pk])
+
+    def test_index_follows_edits(self):
+        """Правка и удаление поста обновляют индекс"""
+        post = self.create_post('Котик')
+        post.text = 'Собака'
+        post.save()
+        self.assertEqual(self.search('котик')[1], [])
+        cache.clear()
+        self.assertEqual(self.search('собака')[1], [post.pk])
+        post.delete()
+        self.assertFalse(SearchEntry.objects.exists())
+        self.assertEqual(SearchTerm.objects.get(term='собак').posts_count, 0)
+
+    @override_settings(POSTS_PER_PAGE=2)
+    def test_cursor_pagination(self):
+        """Курсор ведёт на следующую страницу того же запроса"""
+        posts = [self.create_post('котик ' * (i + 1)) for i in range(5)]
+        expected = [post.pk for post in reversed(posts)]
+        response, first = self.search('котик')
+        cursor = response.context['page_obj'].paginator.next_cursor
+        query = urlencode({'q': 'котик'})
+        self.assertContains(response, f'?{query}&amp;after={cursor}')
+        _, second = self.search('котик', after=cursor)
+        self.assertEqual(first + second, expected[:4])
+
+    def test_rebuild_search_index(self):
+        """rebuild_search_index восстанавливает потерянный индекс"""
+        post = self.create_post('Котики и собаки')
+        SearchEntry.objects.all().delete()
+        SearchTerm.objects.all().delete()
+        call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.search('собака')[1], [post.pk])
+        self.assertEqual(SearchTerm.objects.get(term='котик').posts_count, 1)
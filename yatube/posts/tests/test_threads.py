@@ -0,0 +1,108 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Comment, Post
+from posts.threads import ancestor_ids, get_thread_paginator, segment
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_MAX_DEPTH=2)
+class CommentThreadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def comment(self, text, parent=None):
+        return Comment.objects.create(
+            post=self.post, author=self.user, text=text, parent=parent
+        )
+
+    def refresh(self, *comments):
+        for comment in comments:
+            comment.refresh_from_db()
+
+    def test_path(self):
+        """Путь - сегменты id предков, сортировка по нему - порядок дерева"""
+        first = self.comment('Первый')
+        second = self.comment('Второй')
+        reply = self.comment('Ответ', first)
+        self.assertEqual(reply.path, segment(first.pk) + segment(reply.pk))
+        self.assertEqual(reply.depth, 1)
+        self.assertEqual(ancestor_ids(reply.path), [first.pk])
+        ordered = Comment.objects.filter(post=self.post).order_by('path')
+        self.assertEqual(list(ordered), [first, reply, second])
+
+    def test_replies_count(self):
+        """Число ответов поддерева следует за ответами, включая каскад"""
+        root = self.comment('Корень')
+        child = self.comment('Ответ', root)
+        grandchild = self.comment('Ответ на ответ', child)
+        self.comment('Ещё ответ', grandchild)
+        self.refresh(root, child)
+        self.assertEqual(root.replies_count, 3)
+        self.assertEqual(child.replies_count, 2)
+        child.delete()
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 0)
+        Comment.objects.filter(pk=root.pk).update(replies_count=7)
+        call_command('recount', stdout=StringIO())
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 0)
+
+    def test_deep_threads_collapsed(self):
+        """Глубокие ветки свёрнуты и загружаются отдельным фрагментом"""
+        parent = None
+        chain = []
+        for depth in range(5):
+            parent = self.comment(f'Уровень {depth}', parent)
+            chain.append(parent)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertEqual(list(response.context['comments']), chain[:2])
+        thread_url = reverse(
+            'posts:comment_thread',
+            kwargs={'post_id': self.post.pk, 'comment_id': chain[1].pk},
+        )
+        self.assertContains(response, thread_url)
+        response = self.client.get(thread_url)
+        self.assertEqual(list(response.context['comments']), chain[2:4])
+        self.assertContains(response, 'Показать ответы: 1')
+
+    def test_subtree_single_query(self):
+        """Страница поддерева читается одним запросом"""
+        root = self.comment('Корень')
+        for i in range(3):
+            self.comment(f'Ответ {i}', root)
+        with self.assertNumQueries(1):
+            page = get_thread_paginator(self.post.pk, root).get_cursor_page()
+            comments = [comment.author.username for comment in page]
+        self.assertEqual(len(comments), 3)
+
+    def test_reply(self):
+        """Ответ сохраняется с родителем из того же поста"""
+        root = self.comment('Корень')
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Ответ', 'parent': root.pk},
+        )
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual(reply.parent, root)
+        other = Post.objects.create(author=self.user, text='Другой')
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': other.pk}),
+            {'text': 'Чужой ответ', 'parent': root.pk},
+        )
+        self.assertFalse(Comment.objects.filter(text='Чужой ответ').exists())
@@ -0,0 +1,226 @@
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+        caches[settings.THUMBNAIL_CACHE].clear()
+
+    def create_post(self, text='Пост с картинкой'):
+        self.client.post(reverse('posts:post_create'), {
+            'text': text,
+            'image': SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        })
+        return Post.objects.get(text=text)
+
+    def get_pages(self, post):
+        """Рендерит страницы с постом, считая обращения к Pillow."""
+        with mock.patch.object(Image, 'open', wraps=Image.open) as image_open:
+            responses = [
+                self.client.get(reverse('posts:index')),
+                self.client.get(
+                    reverse('posts:post_detail', args=[post.pk])
+                ),
+            ]
+        return responses, image_open.call_count
+
+    def test_first_render_shows_placeholder(self):
+        """До готовности миниатюр страница не трогает Pillow."""
+        post = self.create_post()
+        self.assertFalse(post.thumbnails_ready)
+        responses, pillow_calls = self.get_pages(post)
+        self.assertEqual(pillow_calls, 0)
+        for response in responses:
+            self.assertContains(response, 'src="data:image/svg+xml')
+
+    def test_render_after_generation(self):
+        """Готовые миниатюры читаются из хранилища без Pillow."""
+        post = self.create_post()
+        thumbnails.generate(post.pk, post.image.name)
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnails_ready)
+        responses, pillow_calls = self.get_pages(post)
+        self.assertEqual(pillow_calls, 0)
+        for response in responses:
+            self.assertNotContains(response, 'src="data:image/svg+xml')
+            self.assertContains(response, '/cache/')
+            self.assertContains(response, 'loading="lazy"')
+            self.assertContains(response, post.image_placeholder)
+
+    def test_placeholder_and_dimensions(self):
+        """После обработки у поста есть размеры и крошечная заглушка."""
+        post = self.create_post()
+        thumbnails.generate(post.pk, post.image.name)
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+        self.assertLess(len(post.image_placeholder), 600)
+
+    def test_failed_variant_still_ready(self):
+        """Сбой одного варианта srcset не оставляет пост без картинки."""
+        post = self.create_post()
+        get_thumbnail = thumbnails.get_thumbnail
+
+        def broken_360(image_name, geometry, **options):
+            if geometry.startswith('360x'):
+                raise OSError('сбой кодека')
+            return get_thumbnail(image_name, geometry, **options)
+
+        with mock.patch.object(thumbnails, 'get_thumbnail', broken_360), \
+                self.assertLogs('posts.thumbnails', 'ERROR'):
+            thumbnails.generate(post.pk, post.image.name)
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnails_ready)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        srcset = response.context['post'].srcset['JPEG']
+        self.assertIn('720w', srcset)
+        self.assertNotIn('360w', srcset)
+
+    def test_stuck_thumbnails_fall_back(self):
+        """Задача, не успевшая за тайм-аут, повторяется, а карточка
+        получает основную миниатюру на месте."""
+        post = self.create_post()
+        Post.objects.filter(pk=post.pk).update(
+            thumbnails_queued=timezone.now() - timedelta(
+                seconds=settings.THUMBNAIL_PENDING_TIMEOUT + 1
+            )
+        )
+        with mock.patch.object(thumbnails, 'get_executor') as get_executor:
+            response = self.client.get(
+                reverse('posts:post_detail', args=[post.pk])
+            )
+            self.client.get(reverse('posts:post_detail', args=[post.pk]))
+        self.assertNotContains(response, 'src="data:image/svg+xml')
+        self.assertContains(response, '/cache/')
+        get_executor.return_value.submit.assert_called_once_with(
+            thumbnails.generate, post.pk, post.image.name
+        )
+
+    def test_pending_survives_cache_clear(self):
+        """Ожидание задачи хранится в посте, а не в кэше процесса."""
+        post = self.create_post()
+        self.assertIsNotNone(post.thumbnails_queued)
+        cache.clear()
+        with mock.patch.object(thumbnails, 'get_executor') as get_executor:
+            responses, pillow_calls = self.get_pages(post)
+        self.assertEqual(pillow_calls, 0)
+        self.assertContains(responses[1], 'src="data:image/svg+xml')
+        get_executor.assert_not_called()
+
+    def test_page_thumbnails_batched(self):
+        """Миниатюры всех карточек страницы читаются одним запросом."""
+        posts = [self.create_post(f'Пост {i}') for i in range(3)]
+        for post in posts:
+            thumbnails.generate(post.pk, post.image.name)
+        caches[settings.THUMBNAIL_CACHE].clear()
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(1):
+            thumbnails.attach_thumbnails(posts)
+        for post in posts:
+            self.assertIn('/cache/', post.thumbnail.url)
+
+    def test_responsive_variants(self):
+        """Карточка выводит srcset из всех ширин каждого формата."""
+        post = self.create_post()
+        thumbnails.generate(post.pk, post.image.name)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        post = response.context['post']
+        for image_format in thumbnails.CARD_FORMATS:
+            with self.subTest(image_format=image_format):
+                widths = [
+                    candidate.rsplit(' ', 1)[1]
+                    for candidate in post.srcset[image_format].split(', ')
+                ]
+                self.assertEqual(
+                    widths, [f'{w}w' for w in thumbnails.CARD_WIDTHS]
+                )
+        self.assertContains(response, f'srcset="{post.srcset["JPEG"]}"')
+        self.assertContains(response, 'sizes="(max-width: 960px)')
+
+    def test_image_bytes_report(self):
+        """Отчёт сравнивает байты до и после srcset для экранов."""
+        self.create_post()
+        out = StringIO()
+        call_command('image_bytes_report', viewport=[360, 1280], stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['images'], 1)
+        mobile = report['viewports']['360']
+        self.assertEqual(mobile['width'], 720)
+        self.assertLessEqual(mobile['after_bytes'], mobile['before_bytes'])
+        self.assertEqual(report['viewports']['1280']['width'], 960)
+
+    def test_image_bytes_report_skips_partial(self):
+        """Картинка без одного из вариантов не роняет отчёт."""
+        post = self.create_post()
+        thumbnails.generate(post.pk, post.image.name)
+        thumbnails.thumbnail_file(
+            post.image.name, *thumbnails.card_variant(360)
+        ).delete()
+        out = StringIO()
+        call_command('image_bytes_report', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['images'], 0)
+
+    def test_new_image_resets_ready(self):
+        """Замена картинки снова ставит миниатюры в очередь."""
+        post = self.create_post()
+        thumbnails.generate(post.pk, post.image.name)
+        post.refresh_from_db()
+        post.image = SimpleUploadedFile(
+            'other.gif', SMALL_GIF, content_type='image/gif'
+        )
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            post.save()
+        self.assertFalse(post.thumbnails_ready)
+        self.assertEqual(post.image_placeholder, '')
+        schedule.assert_called_once_with(post)
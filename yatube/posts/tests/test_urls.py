@@ -1,6 +1,7 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 from posts.models import Group, Post
@@ -56,6 +57,7 @@ class PostURLTest(TestCase):
         self.authorized_client_2.force_login(
             self.user_without_post
         )
+        cache.clear()
 
     def test_public_url(self):
         """страницы доступные всем"""
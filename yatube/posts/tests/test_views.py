@@ -1,6 +1,10 @@
 import shutil
 import tempfile
+from http import HTTPStatus
+from unittest import mock
 
+from core import page_cache
+from core.pagination import CursorPaginator, MergedCursorPaginator
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -8,7 +12,9 @@ from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
-from posts.models import Follow, Group, Post
+from posts.models import Celebrity, Comment, Follow, Group, Post, Timeline
+from posts.signals import invalidate_followed_profile
+from posts.templatetags.post_cards import card_key
 
 User = get_user_model()
 
@@ -73,13 +79,18 @@ class PostViewTest(TestCase):
         self.authorized_client.force_login(self.user)
         self.authorized_client_2.force_login(self.user_without_post)
         cache.clear()
+        # Фоновые миниатюры писали бы в базу мимо транзакции теста.
+        executor = mock.patch('posts.thumbnails.get_executor')
+        executor.start()
+        self.addCleanup(executor.stop)
 
     def _assert_post_has_attribs(self, post):
         self.assertEqual(post.id, self.post.id)
         self.assertEqual(post.text, self.post.text)
         self.assertEqual(post.author, self.post.author)
         self.assertEqual(post.group, self.group)
-        self.assertEqual(post.image, f'posts/{self.uploaded}')
+        self.assertEqual(post.image, self.post.image.name)
+        self.assertRegex(post.image.name, r'^posts/\w\w/\w\w/\w{64}\.gif$')
 
     def test_index_pages_show_correct_context(self):
         """Шаблон index сформирован с правильным контекстом."""
@@ -178,20 +189,122 @@ class PostViewTest(TestCase):
         self.assertNotContains(response, coments['text'])
 
     def test_cache_index(self):
-        """Проверка хранения и очищения кэша для index."""
+        """Index берётся из кэша, пока посты не менялись."""
         response = self.authorized_client.get(reverse('posts:index'))
         posts = response.content
+        response_old = self.authorized_client.get(reverse('posts:index'))
+        self.assertTemplateNotUsed(response_old, 'posts/index.html')
+        self.assertEqual(response_old.content, posts)
         Post.objects.create(
             text='новейший пост',
             author=self.post.author,
         )
-        response_old = self.authorized_client.get(reverse('posts:index'))
-        old_posts = response_old.content
-        self.assertEqual(old_posts, posts)
-        cache.clear()
         response_new = self.authorized_client.get(reverse('posts:index'))
-        new_posts = response_new.content
-        self.assertNotEqual(old_posts, new_posts)
+        self.assertContains(response_new, 'новейший пост')
+        self.assertNotEqual(response_new.content, posts)
+
+    def test_cache_invalidation_is_scoped(self):
+        """Новый пост сбрасывает только свои группу и профиль."""
+        group_url = reverse('posts:group_list', args=[self.group.slug])
+        profile_url = reverse('posts:profile', args=[self.user.username])
+        self.guest_client.get(group_url)
+        self.guest_client.get(profile_url)
+        Post.objects.create(
+            text='пост в другой группе',
+            author=self.user_without_post,
+            group=self.group_without_posts,
+        )
+        self.assertTemplateNotUsed(
+            self.guest_client.get(group_url), 'posts/group_list.html'
+        )
+        self.assertTemplateNotUsed(
+            self.guest_client.get(profile_url), 'posts/profile.html'
+        )
+        Comment.objects.create(
+            post=self.post, author=self.user_without_post, text='коммент'
+        )
+        for url in (group_url, profile_url):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertIn('page_obj', response.context)
+                self.assertContains(response, 'Комментариев: 1')
+
+    def test_cached_page_is_personal(self):
+        """Общая копия страницы дополняется шапкой текущего пользователя."""
+        url = reverse('posts:index')
+        response = self.authorized_client.get(url)
+        self.assertContains(response, f'Пользователь: {self.user.username}')
+        for client, text in (
+            (self.authorized_client_2,
+             f'Пользователь: {self.user_without_post.username}'),
+            (self.guest_client, reverse('users:login')),
+        ):
+            with self.subTest(text=text):
+                response = client.get(url)
+                self.assertTemplateNotUsed(response, 'posts/index.html')
+                self.assertContains(response, text)
+                self.assertNotContains(
+                    response, f'Пользователь: {self.user.username}\n'
+                )
+                self.assertIn('private', response['Cache-Control'])
+
+    def test_cached_profile_follow_button(self):
+        """Кнопка подписки в закэшированном профиле своя у каждого."""
+        url = reverse('posts:profile', args=[self.user.username])
+        follow_url = reverse('posts:profile_follow', args=[self.user.username])
+        unfollow_url = reverse(
+            'posts:profile_unfollow', args=[self.user.username]
+        )
+        response = self.authorized_client.get(url)
+        self.assertNotContains(response, follow_url)
+        Follow.objects.create(user=self.user_without_post, author=self.user)
+        self.authorized_client_2.get(url)
+        response = self.guest_client.get(url)
+        self.assertTemplateNotUsed(response, 'posts/profile.html')
+        self.assertContains(response, follow_url)
+        response = self.authorized_client_2.get(url)
+        self.assertContains(response, unfollow_url)
+
+    def test_cached_profile_following_count(self):
+        """Подписка сбрасывает и профиль подписчика с числом подписок."""
+        url = reverse('posts:profile', args=[self.user_without_post.username])
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'подписок: 0')
+        Follow.objects.create(user=self.user_without_post, author=self.user)
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'подписок: 1')
+
+    def test_conditional_get(self):
+        """Актуальная у клиента страница отдаётся как 304 без рендера."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertIn('Last-Modified', response)
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+                self.assertFalse(response.templates)
+
+    def test_conditional_get_validators_change(self):
+        """Новый комментарий и другой пользователь меняют ETag."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        etag = self.authorized_client.get(url)['ETag']
+        self.assertNotEqual(self.authorized_client_2.get(url)['ETag'], etag)
+        Comment.objects.create(
+            post=self.post, author=self.user_without_post, text='коммент'
+        )
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'коммент')
 
 
 class PaginatorViewsTest(TestCase):
@@ -233,7 +346,9 @@ class PaginatorViewsTest(TestCase):
     def _test_pagination(self, expected_count, url_params=''):
         for reverse_name, template in self.templates_pages_names.items():
             with self.subTest(template=template):
-                response = self.client.get(reverse_name + url_params)
+                response = self.client.get(
+                    reverse_name + url_params, follow=True
+                )
                 self.assertEqual(
                     len(response.context['page_obj']), expected_count
                 )
@@ -247,6 +362,52 @@ class PaginatorViewsTest(TestCase):
 
         self._test_pagination(3, '?page=2')
 
+    def test_legacy_page_redirects_to_cursor(self):
+        """Старая ссылка ?page=N перенаправляет на курсор"""
+        for reverse_name in self.templates_pages_names:
+            with self.subTest(url=reverse_name):
+                response = self.client.get(reverse_name + '?page=2')
+                self.assertEqual(response.status_code, HTTPStatus.FOUND)
+                self.assertIn('?after=', response.url)
+                response = self.client.get(reverse_name + '?page=1')
+                self.assertRedirects(response, reverse_name)
+
+    def test_far_legacy_page_resolved(self):
+        """Дальние ?page=N лент без слияния по-прежнему работают"""
+        Post.objects.bulk_create(
+            Post(text=f'Ещё пост {i}', author=self.author) for i in range(60)
+        )
+        paginator = CursorPaginator(Post.objects.all(), 1)
+        self.assertIsNotNone(paginator.get_legacy_cursor(70))
+        self.assertIsNone(paginator.get_legacy_cursor(10 ** 30))
+
+    def test_legacy_page_number_capped(self):
+        """Слишком дальний ?page=N ленты подписок ведёт на первую"""
+        url = reverse('posts:follow_index')
+        limit = MergedCursorPaginator.legacy_page_limit
+        response = self.authorized_client.get(f'{url}?page={limit + 1}')
+        self.assertRedirects(response, url)
+
+    def test_cursor_navigation(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу"""
+        for reverse_name in self.templates_pages_names:
+            with self.subTest(url=reverse_name):
+                first = self.client.get(reverse_name).context['page_obj']
+                self.assertIsNone(first.paginator.previous_cursor)
+                second = self.client.get(
+                    reverse_name, {'after': first.paginator.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(second), 3)
+                self.assertIsNone(second.paginator.next_cursor)
+                back = self.client.get(
+                    reverse_name, {'before': second.paginator.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+
+    def test_invalid_cursor_shows_first_page(self):
+        """Некорректный курсор открывает первую страницу"""
+        self._test_pagination(10, '?after=garbage')
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -306,6 +467,15 @@ class FollowTests(TestCase):
         )
         self.assertEqual(Follow.objects.all().count(), 0)
 
+    def test_unfollow_signal_reads_no_users(self):
+        """Сброс профилей при удалении подписки не читает пользователей"""
+        follow = Follow.objects.create(
+            user=self.user_following, author=self.user
+        )
+        follow = Follow.objects.get(pk=follow.pk)
+        with self.assertNumQueries(0):
+            invalidate_followed_profile(Follow, follow)
+
     def test_subscription_feed(self):
         """запись появляется в ленте подписчиков"""
         response = self.client_auth_following.get(
@@ -318,3 +488,154 @@ class FollowTests(TestCase):
         """Запись не появляется у неподписанных пользователей"""
         response = self.authorized_client.get(reverse('posts:follow_index'))
         self.assertNotContains(response, self.post.text)
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту уже опубликованные посты автора"""
+        Follow.objects.create(user=self.user_following, author=self.user)
+        self.assertTrue(
+            Timeline.objects.filter(
+                user=self.user_following, post=self.post
+            ).exists()
+        )
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков"""
+        Follow.objects.create(user=self.user_following, author=self.user)
+        new_post = Post.objects.create(author=self.user, text='Новый пост')
+        response = self.client_auth_following.get(
+            reverse('posts:follow_index')
+        )
+        self.assertEqual(response.context['page_obj'][0], new_post)
+        self.assertFalse(
+            Timeline.objects.filter(user=self.user_without_post).exists()
+        )
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает посты автора из ленты"""
+        Follow.objects.create(user=self.user_following, author=self.user)
+        Follow.objects.filter(
+            user=self.user_following, author=self.user
+        ).delete()
+        self.assertFalse(
+            Timeline.objects.filter(user=self.user_following).exists()
+        )
+
+    def test_celebrity_posts_merged_at_read_time(self):
+        """Посты знаменитости не раскладываются, но попадают в ленту"""
+        Follow.objects.create(user=self.user_following, author=self.user)
+        Follow.objects.create(
+            user=self.user_following, author=self.user_without_post
+        )
+        Celebrity.objects.create(author=self.user_without_post)
+        celebrity_post = Post.objects.create(
+            author=self.user_without_post, text='Пост знаменитости'
+        )
+        newest_post = Post.objects.create(author=self.user, text='Свежий')
+        self.assertFalse(
+            Timeline.objects.filter(post=celebrity_post).exists()
+        )
+        response = self.client_auth_following.get(
+            reverse('posts:follow_index')
+        )
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [newest_post, celebrity_post, self.post]
+        )
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='Заголовок для тестовой группы',
+            slug='test_slug',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовая запись для карточки',
+            group=cls.group,
+        )
+        cls.url = reverse('posts:group_list', kwargs={'slug': cls.group.slug})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_card_served_from_cache(self):
+        """Карточка поста берётся из кэша, если ключ не изменился"""
+        response = self.client.get(self.url)
+        post = response.context['page_obj'][0]
+        cache.set(card_key(post, False), '<article>из кэша</article>')
+        page_cache.bump(f'group:{self.group.slug}')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'из кэша')
+
+    def test_card_invalidated_on_change(self):
+        """Правка поста и имени автора меняет ключ карточки"""
+        self.client.get(self.url)
+        self.post.text = 'Изменённый текст'
+        self.post.save()
+        self.user.first_name = 'Новое'
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Изменённый текст')
+        self.assertContains(response, 'Новое')
+
+
+@override_settings(COMMENTS_PER_PAGE=2)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}'
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_shows_first_page(self):
+        """Страница поста показывает только первые комментарии"""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertEqual(
+            list(response.context['comments']), self.comments[:2]
+        )
+        self.assertContains(response, 'js-more-comments')
+
+    def test_fragment_pages(self):
+        """Фрагмент отдаёт следующие комментарии по курсору"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        seen = []
+        while url:
+            response = self.client.get(url)
+            page = response.context['comments']
+            seen.extend(page)
+            cursor = page.paginator.next_cursor
+            url = None
+            if cursor:
+                url = reverse(
+                    'posts:post_comments', kwargs={'post_id': self.post.pk}
+                ) + f'?after={cursor}'
+                self.assertContains(response, f'?after={cursor}')
+        self.assertEqual(seen, self.comments)
+
+    def test_detail_queries_do_not_grow(self):
+        """Число запросов страницы поста не зависит от комментариев"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        with self.assertNumQueries(3):
+            self.client.get(url)
+        for i in range(10):
+            Comment.objects.create(
+                post=self.post, author=self.user, text=f'Ещё {i}'
+            )
+        cache.clear()
+        with self.assertNumQueries(3):
+            self.client.get(url)
@@ -0,0 +1,103 @@
+import re
+
+from core.pagination import CursorPaginator
+from django.conf import settings
+from django.db.models import F
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import Comment
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+# Восемь знаков по основанию 36 - больше двух триллионов комментариев.
+SEGMENT_WIDTH = 8
+# Больше любой цифры сегмента: верхняя граница диапазона поддерева.
+PATH_END = '~'
+PATH = re.compile(r'^[0-9a-z]+$')
+
+
+def segment(pk):
+    digits = []
+    while pk:
+        pk, digit = divmod(pk, len(DIGITS))
+        digits.append(DIGITS[digit])
+    return ''.join(reversed(digits)).rjust(SEGMENT_WIDTH, '0')
+
+
+def ancestor_ids(path):
+    """id предков комментария по его пути, от корня."""
+    return [
+        int(path[start:start + SEGMENT_WIDTH], len(DIGITS))
+        for start in range(0, len(path) - SEGMENT_WIDTH, SEGMENT_WIDTH)
+    ]
+
+
+def place(comment):
+    """Записывает путь и глубину нового комментария.
+
+    Путь состоит из id, поэтому известен только после вставки.
+    """
+    parent = comment.parent
+    comment.path = (parent.path if parent else '') + segment(comment.pk)
+    comment.depth = parent.depth + 1 if parent else 0
+    Comment.objects.filter(pk=comment.pk).update(
+        path=comment.path, depth=comment.depth
+    )
+
+
+def change_replies_count(comment, delta):
+    """Сдвигает число ответов у всех предков комментария одним UPDATE."""
+    ancestors = Comment.objects.filter(pk__in=ancestor_ids(comment.path))
+    if delta < 0:
+        ancestors = ancestors.filter(replies_count__gte=-delta)
+    ancestors.update(replies_count=F('replies_count') + delta)
+
+
+def subtree(queryset, root=None):
+    """Комментарии поддерева ``root`` без него самого, или все.
+
+    Один диапазон по индексу (post, path); вглубь отдаётся не больше
+    COMMENTS_MAX_DEPTH уровней, более глубокие ветки свёрнуты.
+    """
+    max_depth = settings.COMMENTS_MAX_DEPTH
+    if root is None:
+        return queryset.filter(depth__lt=max_depth)
+    return queryset.filter(
+        path__gt=root.path,
+        path__lt=root.path + PATH_END,
+        depth__lte=root.depth + max_depth,
+    )
+
+
+class ThreadPaginator(CursorPaginator):
+    """Курсорная пагинация комментариев в порядке дерева."""
+
+    def __init__(self, object_list, per_page):
+        super().__init__(
+            object_list, per_page, date_field='path', ascending=True
+        )
+
+    def encode_cursor(self, key):
+        path, pk = key
+        return urlsafe_base64_encode(force_bytes(f'{path}|{pk}'))
+
+    def decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            path, pk = force_str(urlsafe_base64_decode(token)).split('|')
+            pk = int(pk)
+        except ValueError:
+            return None
+        if not PATH.match(path):
+            return None
+        return path, pk
+
+
+def get_thread_paginator(post_id, root=None):
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    )
+    return ThreadPaginator(
+        subtree(comments, root), settings.COMMENTS_PER_PAGE
+    )
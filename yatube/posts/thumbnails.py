@@ -0,0 +1,342 @@
+import logging
+import threading
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Ширины карточки для srcset; 960 - основная картинка для src.
+CARD_WIDTHS = (360, 720, 960)
+# WebP есть не в каждой сборке Pillow; без него отдаём только JPEG.
+CARD_FORMATS = ('JPEG', 'WEBP') if features.check('webp') else ('JPEG',)
+
+
+def card_variant(width, image_format='JPEG'):
+    """(геометрия, опции sorl) варианта карточки шириной ``width``."""
+    options = {'crop': 'center', 'upscale': True}
+    if image_format != 'JPEG':
+        options['format'] = image_format
+    return f'{width}x{round(width * 339 / 960)}', options
+
+
+CARD_SIZE = card_variant(960)
+CARD_VARIANTS = tuple(
+    (image_format, width)
+    for image_format in CARD_FORMATS
+    for width in CARD_WIDTHS
+)
+SIZES = tuple(card_variant(width, fmt) for fmt, width in CARD_VARIANTS)
+# Заглушка карточки: те же пропорции, несколько сотен байт в data URI.
+PLACEHOLDER_SIZE = (20, 7)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def drain():
+    """Дожидается фоновых задач; пул будет создан заново при надобности.
+
+    Нужен тестам: задачи пишут в MEDIA_ROOT, который тест вот-вот
+    подменит или удалит.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def thumbnail_file(image_name, geometry, options):
+    """Файл миниатюры под тем именем, которое даст ему sorl.
+
+    Повторяет разбор опций из ThumbnailBackend.get_thumbnail, но не
+    обращается ни к KV-хранилищу, ни к Pillow.
+    """
+    backend = default.backend
+    source = ImageFile(image_name)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def get_many(files):
+    """Записи KV-хранилища sorl для пачки миниатюр.
+
+    Для cached_db хранилища это один get_many к кэшу и один запрос к
+    базе за промахами вместо пары обращений на каждую миниатюру.
+    Возвращает список ImageFile или None в порядке ``files``.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return [kvstore.get(file) for file in files]
+    keys = [add_prefix(file.key) for file in files]
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStore.objects.filter(key__in=missing).values_list('key', 'value')
+        )
+        fetched = {
+            key: found.get(key, cached_db_kvstore.EMPTY_VALUE)
+            for key in missing
+        }
+        kvstore.cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return [
+        None if values[key] == cached_db_kvstore.EMPTY_VALUE
+        else deserialize_image_file(values[key])
+        for key in keys
+    ]
+
+
+def attach_thumbnails(posts):
+    """Проставляет постам готовые миниатюры карточки.
+
+    ``thumbnail`` - основная JPEG-картинка, ``srcset`` - строки srcset
+    по форматам. Все варианты всех постов читаются из KV-хранилища
+    одной пачкой. Пока миниатюры в очереди, ``thumbnail`` - None и
+    шаблон покажет заглушку. Основная картинка создаётся на месте, как
+    раньше, для отмеченных готовыми старых постов без записи в KV и для
+    постов, чья задача не уложилась в THUMBNAIL_PENDING_TIMEOUT: такая
+    задача заодно ставится в очередь заново.
+    """
+    for post in posts:
+        post.thumbnail = None
+        post.srcset = {}
+    ready = [post for post in posts if post.image and post.thumbnails_ready]
+    ready += overdue(
+        [post for post in posts if post.image and not post.thumbnails_ready]
+    )
+    files = [
+        thumbnail_file(post.image.name, *card_variant(width, image_format))
+        for post in ready
+        for image_format, width in CARD_VARIANTS
+    ]
+    found = iter(get_many(files))
+    for post in ready:
+        variants = {}
+        for variant in CARD_VARIANTS:
+            thumbnail = next(found)
+            if thumbnail is not None:
+                variants[variant] = thumbnail
+        post.thumbnail = variants.get(('JPEG', 960)) or card_on_demand(post)
+        if post.thumbnail is None:
+            continue
+        variants[('JPEG', 960)] = post.thumbnail
+        for image_format in CARD_FORMATS:
+            post.srcset[image_format] = ', '.join(
+                f'{variants[image_format, width].url} {width}w'
+                for width in CARD_WIDTHS
+                if (image_format, width) in variants
+            )
+
+
+def overdue(posts):
+    """Посты, чьи миниатюры ждут дольше THUMBNAIL_PENDING_TIMEOUT."""
+    deadline = timezone.now() - timedelta(
+        seconds=settings.THUMBNAIL_PENDING_TIMEOUT
+    )
+    stuck = [
+        post for post in posts
+        if post.thumbnails_queued is None or post.thumbnails_queued < deadline
+    ]
+    for post in stuck:
+        retry(post)
+    return stuck
+
+
+def card_on_demand(post):
+    """Основная миниатюра, созданная прямо в запросе, или None."""
+    geometry, options = CARD_SIZE
+    try:
+        return get_thumbnail(post.image.name, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', post.image.name)
+        return None
+
+
+def missing_sizes(image_name):
+    return [
+        (geometry, options) for geometry, options in SIZES
+        if not default.kvstore.get(
+            thumbnail_file(image_name, geometry, options)
+        )
+    ]
+
+
+def ensure_thumbnails(image_name):
+    """Создаёт недостающие миниатюры картинки.
+
+    Возвращает 'skipped', если все уже были в KV-хранилище, 'failed',
+    если не удалась основная миниатюра карточки, иначе 'generated':
+    без отдельных вариантов srcset карточка обойдётся, их доделает
+    повторный запуск.
+    """
+    missing = missing_sizes(image_name)
+    if not missing:
+        return 'skipped'
+    for geometry, options in missing:
+        try:
+            get_thumbnail(image_name, geometry, **options)
+        except Exception:
+            logger.exception(
+                'Не удалось создать миниатюру %s %s', image_name, geometry
+            )
+    if CARD_SIZE in missing_sizes(image_name):
+        return 'failed'
+    return 'generated'
+
+
+def describe_image(image_name):
+    """Исходные размеры картинки и размытая заглушка карточки.
+
+    Возвращает значения полей поста; заглушка - крошечная JPEG того же
+    кадра, что и миниатюра карточки, в data URI.
+    """
+    with default_storage.open(image_name) as file:
+        image = Image.open(file)
+        width, height = image.size
+        image.draft('RGB', (PLACEHOLDER_SIZE[0] * 8, PLACEHOLDER_SIZE[1] * 8))
+        placeholder = ImageOps.fit(image.convert('RGB'), PLACEHOLDER_SIZE)
+    buffer = BytesIO()
+    placeholder.save(buffer, 'JPEG', quality=50, optimize=True)
+    data = b64encode(buffer.getvalue()).decode()
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_placeholder': f'data:image/jpeg;base64,{data}',
+    }
+
+
+def backfill_image(item):
+    """Задача пула процессов для backfill_thumbnails.
+
+    (pk, картинка, есть ли заглушка) -> (pk, результат, поля поста или
+    None, если заглушка уже есть или сделать её не удалось).
+    """
+    pk, image_name, has_placeholder = item
+    try:
+        status = ensure_thumbnails(image_name)
+        if status == 'failed' or has_placeholder:
+            return pk, status, None
+        return pk, status, describe_image(image_name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', image_name)
+        return pk, 'failed', None
+
+
+def generate(post_id, image_name):
+    """Создаёт миниатюры и заглушку картинки и отмечает пост готовым.
+
+    Пост готов, как только есть основная миниатюра; без заглушки и
+    части вариантов srcset карточка тоже выводится. Если картинку
+    успели заменить, пост не трогается: миниатюры новой картинки уже
+    стоят в очереди.
+    """
+    try:
+        if ensure_thumbnails(image_name) == 'failed':
+            return
+        try:
+            fields = describe_image(image_name)
+        except Exception:
+            logger.exception('Не удалось создать заглушку %s', image_name)
+            fields = {}
+        post = Post.objects.filter(pk=post_id, image=image_name).first()
+        if post is not None:
+            for field, value in fields.items():
+                setattr(post, field, value)
+            post.thumbnails_ready = True
+            post.save(update_fields=['thumbnails_ready', *fields])
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', image_name)
+    finally:
+        connections.close_all()
+
+
+def image_files(image_name):
+    """Файл картинки и её миниатюры карточки, которые есть на диске."""
+    files = [ImageFile(image_name, Post.image.field.storage)]
+    files += [
+        thumbnail_file(image_name, geometry, options)
+        for geometry, options in SIZES
+    ]
+    return [file for file in files if file.exists()]
+
+
+def delete_image(image_name):
+    """Удаляет картинку, её миниатюры и их записи в KV-хранилище sorl.
+
+    Возвращает число освобождённых байт.
+    """
+    freed = 0
+    for file in image_files(image_name):
+        freed += file.storage.size(file.name)
+        file.delete()
+    # Заодно удаляет миниатюры, созданные sorl в других размерах.
+    default.kvstore.delete(ImageFile(image_name))
+    return freed
+
+
+def schedule(post):
+    """Ставит миниатюры поста в очередь после фиксации транзакции.
+
+    Пока задача ждёт, карточка показывает заглушку, но не дольше
+    THUMBNAIL_PENDING_TIMEOUT от thumbnails_queued: задача могла упасть
+    или пропасть вместе с процессом.
+    """
+    post_id, image_name = post.pk, post.image.name
+    transaction.on_commit(
+        lambda: get_executor().submit(generate, post_id, image_name)
+    )
+
+
+def retry(post):
+    """Повторно ставит в очередь застрявшую задачу, одну на тайм-аут.
+
+    Время в посте сдвигается условным UPDATE, поэтому из процессов,
+    одновременно заметивших застрявший пост, задачу ставит один.
+    """
+    queued = timezone.now()
+    if Post.objects.filter(
+        pk=post.pk,
+        thumbnails_ready=False,
+        thumbnails_queued=post.thumbnails_queued,
+    ).update(thumbnails_queued=queued):
+        post.thumbnails_queued = queued
+        get_executor().submit(generate, post.pk, post.image.name)
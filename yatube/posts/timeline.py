@@ -0,0 +1,132 @@
+import itertools
+from operator import itemgetter
+
+from core.pagination import MergedCursorPaginator
+from django.conf import settings
+from django.db import connection
+
+from .models import Celebrity, Follow, Post, Timeline
+
+
+def is_celebrity(author_id):
+    return Celebrity.objects.filter(author_id=author_id).exists()
+
+
+def batch_size():
+    """TIMELINE_BATCH_SIZE, но не больше, чем база примет одной вставкой.
+
+    Явный batch_size у bulk_create обходит ограничение SQLite на число
+    строк в одном INSERT.
+    """
+    limit = connection.ops.bulk_batch_size(Timeline._meta.concrete_fields, [])
+    return min(settings.TIMELINE_BATCH_SIZE, limit or float('inf'))
+
+
+def fan_out(post):
+    """Раскладывает пост по лентам подписчиков, если автор не знаменитость."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    Timeline.objects.bulk_create(
+        (
+            Timeline(
+                user_id=user_id,
+                post_id=post.pk,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in followers.iterator()
+        ),
+        batch_size=batch_size(),
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'pub_date')
+    Timeline.objects.bulk_create(
+        (
+            Timeline(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts.iterator()
+        ),
+        batch_size=batch_size(),
+        ignore_conflicts=True,
+    )
+
+
+def fill(follows, chunk_size=2000):
+    """Раскладывает посты авторов по лентам подписок ``follows`` пачками.
+
+    То же, что backfill на каждую подписку, но посты автора читаются один
+    раз на всех его подписчиков. Подписки на знаменитостей пропускаются,
+    поэтому звать после reclassify_authors. Возвращает число строк лент.
+    """
+    follows = follows.filter(
+        author__celebrity__isnull=True
+    ).order_by('author_id', 'user_id').values_list('author_id', 'user_id')
+    filled = 0
+    for author_id, pairs in itertools.groupby(
+        follows.iterator(chunk_size=chunk_size), key=itemgetter(0)
+    ):
+        followers = [user_id for _, user_id in pairs]
+        posts = list(Post.objects.filter(
+            author_id=author_id
+        ).values_list('id', 'pub_date'))
+        Timeline.objects.bulk_create(
+            (
+                Timeline(
+                    user_id=user_id,
+                    post_id=post_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for user_id in followers
+                for post_id, pub_date in posts
+            ),
+            batch_size=batch_size(),
+            ignore_conflicts=True,
+        )
+        filled += len(followers) * len(posts)
+    return filled
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты подписчика посты автора."""
+    Timeline.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def get_feed_paginator(user):
+    """Пагинатор ленты подписок: материализованная часть и знаменитости.
+
+    Посты обычных авторов читаются из Timeline, посты знаменитостей -
+    напрямую по индексу (author, pub_date) каждого из них.
+    """
+    sources = [
+        (
+            user.timeline.select_related('post__author', 'post__group'),
+            'post_id',
+        ),
+    ]
+    celebrities = Celebrity.objects.filter(
+        author__following__user=user
+    ).values_list('author_id', flat=True)
+    for author_id in celebrities:
+        sources.append((
+            Post.objects.filter(
+                author_id=author_id
+            ).select_related('author', 'group'),
+            'pk',
+        ))
+    return MergedCursorPaginator(sources, settings.POSTS_PER_PAGE)
@@ -0,0 +1,68 @@
+import gzip
+import io
+import sys
+from contextlib import contextmanager
+
+from django.core.management.color import no_style
+from django.db import connection
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Post
+
+# Порядок записей в файле: на что ссылаются, то выгружается раньше.
+KINDS = ('user', 'group', 'post', 'comment', 'follow')
+
+
+@contextmanager
+def open_stream(path, mode):
+    """Файл JSONL для чтения ('r') или записи ('w'); '-' - stdin/stdout.
+
+    Файлы с расширением .gz сжимаются и распаковываются на лету.
+    """
+    if path == '-':
+        standard = sys.stdin if mode == 'r' else sys.stdout
+        stream = io.TextIOWrapper(standard.buffer, encoding='utf-8')
+        try:
+            yield stream
+        finally:
+            stream.flush()
+            # Сам stdin/stdout остаётся открытым.
+            stream.detach()
+        return
+    if path.endswith('.gz'):
+        stream = gzip.open(path, f'{mode}t', encoding='utf-8')
+    else:
+        stream = open(path, mode, encoding='utf-8')
+    with stream:
+        yield stream
+
+
+def dump_datetime(value):
+    return value.isoformat()
+
+
+def load_datetime(value):
+    return parse_datetime(value)
+
+
+@contextmanager
+def raw_dates():
+    """Отключает auto_now_add, чтобы bulk_create сохранил даты из файла."""
+    fields = [
+        Post._meta.get_field('pub_date'),
+        Comment._meta.get_field('created'),
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def reset_sequences(*models):
+    """Сдвигает последовательности PostgreSQL после вставки явных id."""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
@@ -1,63 +1,125 @@
+from core.page_cache import conditional_page, versioned_cache_page
+from core.pagination import CursorPaginator
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
-from django.views.decorators.cache import cache_page
+from django.utils.http import urlencode
 
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, Timeline, User
+from .search import SearchPaginator
+from .threads import get_thread_paginator
+from .thumbnails import attach_thumbnails
+from .timeline import get_feed_paginator
 
 
-def paginate_queryset(request, queryset):
-    paginator = Paginator(queryset, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+def paginate(request, paginator):
+    page_obj = paginator.get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
     return {'page_obj': page_obj}
 
 
-@cache_page(20)
+def legacy_page_redirect(request, paginator):
+    """Перенаправляет старые ссылки ?page=N на соответствующий курсор."""
+    page_number = request.GET.get('page')
+    if page_number is None:
+        return None
+    cursor = paginator.get_legacy_cursor(page_number)
+    if cursor is None:
+        return redirect(request.path)
+    return redirect(f'{request.path}?after={cursor}')
+
+
+@versioned_cache_page(settings.PAGE_CACHE_TIMEOUT, 'posts')
 def index(request):
     posts = Post.objects.select_related('author', 'group')
-    context = paginate_queryset(request, posts)
+    paginator = CursorPaginator(posts, settings.POSTS_PER_PAGE)
+    legacy_redirect = legacy_page_redirect(request, paginator)
+    if legacy_redirect:
+        return legacy_redirect
+    context = paginate(request, paginator)
     return render(request, 'posts/index.html', context)
 
 
+@versioned_cache_page(settings.PAGE_CACHE_TIMEOUT, 'groups', 'group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author')
+    posts = group.posts.select_related('author', 'group')
+    paginator = CursorPaginator(posts, settings.POSTS_PER_PAGE)
+    legacy_redirect = legacy_page_redirect(request, paginator)
+    if legacy_redirect:
+        return legacy_redirect
     context = {
         'group': group,
         'posts': posts
     }
-    context.update(paginate_queryset(request, posts))
+    context.update(paginate(request, paginator))
     return render(request, 'posts/group_list.html', context)
 
 
+def profile_follow_scopes(username):
+    """Подписки сбрасывают профиль по id: сигналу не нужны имена."""
+    user_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    return [f'follows:{user_id}']
+
+
+@versioned_cache_page(
+    settings.PAGE_CACHE_TIMEOUT,
+    'groups',
+    'author:{username}',
+    profile_follow_scopes,
+)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     posts_author = author.posts.select_related('group')
-    posts_count = author.posts.count()
-    if request.user.is_authenticated and request.user != author:
-        following = Follow.objects.select_related(
-            'user', 'author'
-        ).exists()
-    else:
-        following = False
+    paginator = CursorPaginator(posts_author, settings.POSTS_PER_PAGE)
+    legacy_redirect = legacy_page_redirect(request, paginator)
+    if legacy_redirect:
+        return legacy_redirect
+    posts_count = author.stats.posts_count
     context = {
         'author': author,
         'posts_count': posts_count,
-        'following': following,
     }
 
-    context.update(paginate_queryset(request, posts_author))
+    context.update(paginate(request, paginator))
     return render(request, 'posts/profile.html', context)
 
 
+@versioned_cache_page(settings.PAGE_CACHE_TIMEOUT, 'posts')
+def search(request):
+    query = request.GET.get('q', '').strip()[:settings.SEARCH_QUERY_LENGTH]
+    paginator = SearchPaginator(query, settings.POSTS_PER_PAGE)
+    context = {
+        'query': query,
+        'extra_query': f'{urlencode({"q": query})}&' if query else '',
+    }
+    context.update(paginate(request, paginator))
+    return render(request, 'posts/search.html', context)
+
+
+def post_detail_scopes(post_id):
+    username = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True
+    ).first()
+    return ['groups', f'post:{post_id}', f'author:{username}']
+
+
+@conditional_page(post_detail_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
-    posts_count = post.author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    attach_thumbnails([post])
+    comments = get_thread_paginator(post.pk).get_cursor_page()
+    posts_count = post.author.stats.posts_count
     author = post.author.get_full_name()
     form = CommentForm()
     context = {
@@ -66,11 +128,47 @@ def post_detail(request, post_id):
         'author': author,
         'title': post.text[:settings.SYMBOL_IN_TITLE],
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'collapse_depth': settings.COMMENTS_MAX_DEPTH - 1,
+        'reply_to': request.GET.get('reply_to', ''),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@versioned_cache_page(
+    settings.PAGE_CACHE_TIMEOUT, 'groups', 'post:{post_id}'
+)
+def post_comments(request, post_id):
+    """Следующая страница комментариев поста фрагментом HTML."""
+    comments = get_thread_paginator(post_id).get_cursor_page(
+        after=request.GET.get('after')
+    )
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+        'collapse_depth': settings.COMMENTS_MAX_DEPTH - 1,
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+@versioned_cache_page(
+    settings.PAGE_CACHE_TIMEOUT, 'groups', 'post:{post_id}'
+)
+def comment_thread(request, post_id, comment_id):
+    """Свёрнутая ветка комментария фрагментом HTML."""
+    root = get_object_or_404(Comment, pk=comment_id, post_id=post_id)
+    comments = get_thread_paginator(post_id, root).get_cursor_page(
+        after=request.GET.get('after')
+    )
+    context = {
+        'post_id': post_id,
+        'root': root,
+        'comments': comments,
+        'collapse_depth': root.depth + settings.COMMENTS_MAX_DEPTH,
+    }
+    return render(request, 'includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -85,7 +183,7 @@ def post_create(request):
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    if request.user != post.author:
+    if request.user.pk != post.author_id:
         return redirect('posts:post_detail', post.pk)
     form = PostForm(
         request.POST or None,
@@ -104,6 +202,15 @@ def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
+        parent_id = request.POST.get('parent', '')
+        if parent_id:
+            # Отвечать можно только на комментарий того же поста.
+            parent = parent_id.isdigit() and Comment.objects.filter(
+                pk=parent_id, post=post
+            ).first()
+            if not parent:
+                return redirect('posts:post_detail', post_id=post_id)
+            comment.parent = parent
         comment.author = request.user
         comment.post = post
         comment.save()
@@ -112,8 +219,16 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    list_of_posts = Post.objects.filter(author__following__user=request.user)
-    context = paginate_queryset(request, list_of_posts)
+    paginator = get_feed_paginator(request.user)
+    legacy_redirect = legacy_page_redirect(request, paginator)
+    if legacy_redirect:
+        return legacy_redirect
+    context = paginate(request, paginator)
+    page_obj = context['page_obj']
+    page_obj.object_list = [
+        entry.post if isinstance(entry, Timeline) else entry
+        for entry in page_obj
+    ]
     return render(request, 'posts/follow.html', context)
 
 
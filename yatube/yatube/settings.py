@@ -101,6 +101,11 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 POSTS_PER_PAGE = 10
 
+COMMENTS_PER_PAGE = 20
+
+# Глубже этого ветки комментариев свёрнуты до запроса.
+COMMENTS_MAX_DEPTH = 4
+
 SYMBOL_IN_TITLE = 30
 
 LOGIN_URL = 'users:login'
@@ -119,8 +124,71 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# В default лежат версии страниц, сами страницы и карточки постов.
+# Для работы в несколько процессов default должен быть общим для всех
+# (memcached, Redis): иначе bump в одном процессе не виден остальным.
+# Метаданные миниатюр sorl - в отдельном кэше, чтобы не вытеснять
+# страницы.
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'thumbnails': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'thumbnails',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
+
+THUMBNAIL_CACHE = 'thumbnails'
+
+# Кэши, которые у каждого процесса свои.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+SHARED_CACHE = CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+TIMELINE_BATCH_SIZE = 1000
+
+CELEBRITY_FOLLOWERS_THRESHOLD = 10000
+
+# Ключ карточки - отпечаток её содержимого, устаревшая карточка просто
+# не читается, поэтому срок может быть долгим и с локальным кэшем.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Страницу сбрасывает bump; в локальном кэше другого процесса он не
+# виден, поэтому без общего кэша страница живёт недолго.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6 if SHARED_CACHE else 20
+
+THUMBNAIL_WORKERS = 2
+
+# Сколько карточка ждёт фоновых миниатюр, прежде чем сделать основную
+# на месте и поставить задачу заново.
+THUMBNAIL_PENDING_TIMEOUT = 10 * 60
+
+# Картинки постов: больше этого загрузка отклоняется - это предел
+# безопасности, фото с телефона в 40 МБ и 108 Мп проходят...
+IMAGE_UPLOAD_MAX_SIZE = 100 * 2 ** 20
+
+IMAGE_MAX_PIXELS = 120_000_000
+
+# ...и уменьшаются до этого по длинной стороне...
+IMAGE_MAX_SIDE = 2048
+
+# ...и до этого размера файла: сначала снижается качество JPEG, затем
+# размер картинки.
+IMAGE_STORED_MAX_SIZE = 2 * 2 ** 20
+
+IMAGE_JPEG_QUALITY = 85
+
+IMAGE_JPEG_MIN_QUALITY = 60
+
+# Поиск: сколько лучших вхождений читать на слово и сколько слов запроса.
+SEARCH_CANDIDATES = 1000
+
+SEARCH_MAX_TERMS = 5
+
+SEARCH_QUERY_LENGTH = 200